@@ -1,185 +1,226 @@
 # app.py
 
-from dash import Dash, html, dash_table, dcc, ctx, Input, Output, callback_context
+from dash import Dash, html, dash_table, dcc, ctx, Input, Output, State, ClientsideFunction
 import dash_mantine_components as dmc
+import numpy as np
 import pandas as pd
-import datetime
-import data.data_handler as data_handler
+import os
+import threading
+from collections import OrderedDict
+from flask import Response, jsonify, request
+import data.data_matrix as data_matrix
+import data.data_metrics as data_metrics
+import data.data_snapshot as data_snapshot
+import data.data_table as data_table
 import plotly.graph_objects as go
 
-df_game_plan, df_team_plans, df_team_stats, df_score_board = data_handler.get_second_league()
-last_update = datetime.datetime.now()
+# Data is scraped in the background, callbacks only read the latest snapshot
+# Workers of the multi-worker mode read the snapshots of the refresher process instead
+refresher = data_snapshot.snapshot_source().start()
+
+def format_update_info(snapshot):
+    return f"Stand: {snapshot.timestamp.strftime('%d.%m.%Y %H:%M:%S')}"
+
+# Page, sort and filter the game table on the server instead of shipping all games
+SERVER_SIDE_GAME_TABLE = os.environ.get("DSV_SERVER_SIDE_TABLE", "1") == "1"
+GAME_TABLE_PAGE_SIZE = 25
+
+# Callback results keyed by snapshot version, least recently used entries are dropped
+PAYLOAD_CACHE_SIZE = 128
+_payload_cache = OrderedDict()
+_payload_cache_lock = threading.Lock()
+
+def cached(key, build):
+    with _payload_cache_lock:
+        data_metrics.cache_lookup("payload", key in _payload_cache)
+        if key in _payload_cache:
+            _payload_cache.move_to_end(key)
+            return _payload_cache[key]
+
+    value = build()
+    with _payload_cache_lock:
+        _payload_cache[key] = value
+        while len(_payload_cache) > PAYLOAD_CACHE_SIZE:
+            _payload_cache.popitem(last=False)
+
+    return value
 
 app = Dash(__name__, external_stylesheets=["https://cdn.jsdelivr.net/npm/@mantine/core@7.17.5/styles.css"])
 
-app.layout = dmc.MantineProvider(
-    children=[
-        html.Div([
-            # Headline
-            html.H2("Wasserball Team Dashboard"),
+# Prometheus metrics of the refresh pipeline and the callbacks
+# Workers of the multi-worker mode only have their callback metrics, the refresher process serves the others
+@app.server.route("/metrics")
+def metrics():
+    return Response(data_metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# Seconds after a snapshot before the update button asks for the next refresh
+UPDATE_LOCK_SECONDS = 290
+
+# Version of a snapshot as polled by the browsers, the etag also changes with refreshes that found nothing new
+def version_info(snapshot):
+    return {
+        "version": snapshot.version,
+        "etag": f"{snapshot.version}-{snapshot.timestamp:%Y%m%d%H%M%S%f}",
+        "info": format_update_info(snapshot),
+        "update_allowed_at": snapshot.timestamp.timestamp() + UPDATE_LOCK_SECONDS
+    }
+
+# Version check for the browsers, answered with 304 while the snapshot is unchanged
+@app.server.route("/snapshot-version")
+def current_version():
+    snapshot = refresher.current(wait=False)
+    if snapshot is None:
+        return Response(status=503)
+
+    info = version_info(snapshot)
+    response = jsonify(info)
+    response.set_etag(info["etag"])
+    response.headers["Cache-Control"] = "no-cache"
+    response = response.make_conditional(request)
+    data_metrics.cache_lookup("snapshot_version", response.status_code == 304)
+
+    return response
 
-            # Update Button and last update info
+if SERVER_SIDE_GAME_TABLE:
+    game_table_options = dict(
+        page_action="custom",
+        page_current=0,
+        page_size=GAME_TABLE_PAGE_SIZE,
+        sort_action="custom",
+        sort_mode="single",
+        sort_by=[],
+        filter_action="custom",
+        filter_query=""
+    )
+else:
+    game_table_options = {}
+
+# Result colours of the game table, the browser adds the highlighting of the selected team
+GAME_PLAN_STYLE = [
+    {
+        "if": {"filter_query": "{Ergebnis_Typ} = 'Sieg'", "column_id": "Ergebnis"},
+        "backgroundColor": "#d4edda", "color": "#155724"
+    },
+    {
+        "if": {"filter_query": "{Ergebnis_Typ} = 'Niederlage'", "column_id": "Ergebnis"},
+        "backgroundColor": "#f8d7da", "color": "#721c24"
+    },
+    {
+        "if": {"filter_query": "{Ergebnis_Typ} = 'Sieg nach 5m'", "column_id": "Ergebnis"},
+        "backgroundColor": "#e6f4ea", "color": "#1b5e20"
+    },
+    {
+        "if": {"filter_query": "{Ergebnis_Typ} = 'Niederlage nach 5m'", "column_id": "Ergebnis"},
+        "backgroundColor": "#fcebea", "color": "#b71c1c"
+    }
+]
+
+def serve_layout():
+    snapshot = refresher.current()
+
+    return dmc.MantineProvider(
+        children=[
             html.Div([
-                dmc.Button(
-                    "Daten aktualisieren",
-                    id="update-button",
-                    variant="light",
-                    color="blue",
-                    disabled=False
-                ),
-                html.Span(id="update-icon", style={"marginLeft": "10px", "fontSize": "20px"}),
-                html.Div(
-                    id="update-info",
-                    children=f"Stand: {last_update.strftime('%d.%m.%Y %H:%M:%S')}",
-                    style={"whiteSpace": "nowrap"}
-                )
-            ],
-            style={
-                "display": "flex",
-                "justifyContent": "space-between",
-                "alignItems": "center",
-                "gap": "10px",
-                "flexWrap": "nowrap"
-            }),
-
-            dcc.Interval(
-                id="interval-component",
-                interval=5*60*1000,  # alle 5 Minuten (in Millisekunden)
-                n_intervals=0,
-                disabled=False
-            ),
-
-            html.Br(),
-
-            # Scoreboard
-            #html.H4("Tabelle"),
-            dash_table.DataTable(
-                id="scoreboard",
-                columns=[
-                    {"name": "#", "id": "Platzierung"},
-                    {"name": "Team", "id": "Team"},
-                    {"name": "Punkte", "id": "Punkte"}
+                # Headline
+                html.H2("Wasserball Team Dashboard"),
+
+                # Update Button and last update info
+                html.Div([
+                    dmc.Button(
+                        "Daten aktualisieren",
+                        id="update-button",
+                        variant="light",
+                        color="blue",
+                        disabled=False
+                    ),
+                    html.Span(id="update-icon", style={"marginLeft": "10px", "fontSize": "20px"}),
+                    html.Div(
+                        id="update-info",
+                        children=format_update_info(snapshot),
+                        style={"whiteSpace": "nowrap"}
+                    )
                 ],
-                data=df_score_board.to_dict("records"),
-                style_table={"overflowX": "auto", "width": "100%"},
-                style_cell={"textAlign": "center", "minWidth": "100px", "whiteSpace": "normal"},
-                row_selectable="single",
-                selected_rows=[]
-            ),
-
-            # Combined Graph
-            dcc.Graph(id="stacked-games-graph"),
-            dcc.Graph(id="relative-goals-graph"),
-
-            html.Br(),
-
-            # Gameplan
-            #html.H4("Spieleübersicht"),
-            dash_table.DataTable(
-                id="gameplan",
-                style_table={"overflowX": "auto", "width": "100%"},
-                style_cell={"textAlign": "center", "minWidth": "100px", "whiteSpace": "normal"}
-            )
-        ])
-    ]
-)
+                style={
+                    "display": "flex",
+                    "justifyContent": "space-between",
+                    "alignItems": "center",
+                    "gap": "10px",
+                    "flexWrap": "nowrap"
+                }),
 
-@app.callback(
-    [Output("update-button", "disabled"),
-     Output("update-icon", "children"),
-     Output("interval-component", "disabled")],
-    [Input("update-info", "children"),
-     Input("interval-component", "n_intervals")]
-)
-def disable_update_button(_, n_intervals):
-    now = datetime.datetime.now()
-    diff = (now - last_update).total_seconds()
-    if diff < 290:
-        return True, "🕒", False  # Button deaktiviert, Uhr anzeigen, Intervall läuft weiter
-    else:
-        return False, "", True  # Button aktiv, Uhr weg, Intervall abschalten
+                # Picks up snapshots published by the background refresh, the browser polls
+                # /snapshot-version and only asks for new data when the version changed
+                dcc.Interval(
+                    id="snapshot-poll",
+                    interval=10*1000,
+                    n_intervals=0
+                ),
+                dcc.Store(id="snapshot-info", data=version_info(snapshot)),
+                dcc.Store(id="snapshot-version", data=snapshot.version),
 
-@app.callback(
-    [Output("scoreboard", "style_data_conditional"),
-     Output("gameplan", "columns"),
-     Output("gameplan", "data"),
-     Output("gameplan", "style_data_conditional"),
-     Output("stacked-games-graph", "figure"),
-     Output("relative-goals-graph", "figure")],
-    [Input("scoreboard", "selected_rows"),
-     Input("scoreboard", "data")]
-)
-def update_dashboard(selected_rows, data):
-    if selected_rows:
-        selected_index = selected_rows[0]
-        team = data[selected_index]["Team"]
-    else:
-        team = None
-
-    if team:
-        table_style_data = [
-            {
-                "if": {"filter_query": f"{{Team}} = '{team}'"},
-                "backgroundColor": "#e0f3ff"
-            }
-        ]
-    else:
-        table_style_data = []
-    
-    if not team:
-        df_game_plan_filtered = df_game_plan.copy()
-        games_data = df_game_plan_filtered[["Datum_Uhrzeit", "Heim", "Gast", "Ergebnis", "Status"]].to_dict("records")
-        table_format = [
-            {"name": "Datum", "id": "Datum_Uhrzeit"},
-            {"name": "Heim", "id": "Heim"},
-            {"name": "Gast", "id": "Gast"},
-            {"name": "Ergebnis", "id": "Ergebnis"},
-            #{"name": "Status", "id": "Status"}
-        ]
-    else:
-        df_team_plans_filtered = df_team_plans.get(team, pd.DataFrame())
-        games_data = df_team_plans_filtered[["Datum_Uhrzeit", "Heim", "Gast", "Ergebnis", "Ergebnis_Typ", "Spielort", "Status"]].to_dict("records")
-        table_format = [
-            {"name": "Datum", "id": "Datum_Uhrzeit"},
-            {"name": "Heim", "id": "Heim"},
-            {"name": "Gast", "id": "Gast"},
-            {"name": "Ergebnis", "id": "Ergebnis"}
-        ]
+                # Game lists and head-to-head records of all teams for the current snapshot
+                dcc.Store(id="team-payloads"),
+                # Selected team by name, rows of a new snapshot can be in another order
+                dcc.Store(id="selected-team"),
 
-    game_plan_style_data = [
-        {
-            "if": {"filter_query": "{Ergebnis_Typ} = 'Sieg'", "column_id": "Ergebnis"},
-            "backgroundColor": "#d4edda", "color": "#155724"
-        },
-        {
-            "if": {"filter_query": "{Ergebnis_Typ} = 'Niederlage'", "column_id": "Ergebnis"},
-            "backgroundColor": "#f8d7da", "color": "#721c24"
-        },
-        {
-            "if": {"filter_query": "{Ergebnis_Typ} = 'Sieg nach 5m'", "column_id": "Ergebnis"},
-            "backgroundColor": "#e6f4ea", "color": "#1b5e20"
-        },
-        {
-            "if": {"filter_query": "{Ergebnis_Typ} = 'Niederlage nach 5m'", "column_id": "Ergebnis"},
-            "backgroundColor": "#fcebea", "color": "#b71c1c"
-        }
-    ]
-
-    if team:
-        game_plan_style_data += [
-            {
-                "if": {"filter_query": f"{{Heim}} = '{team}'", "column_id": "Heim"},
-                "backgroundColor": "#e0f3ff"
-            },
-            {
-                "if": {"filter_query": f"{{Gast}} = '{team}'", "column_id": "Gast"},
-                "backgroundColor": "#e0f3ff"
-            }
+                html.Br(),
+
+                # Scoreboard
+                #html.H4("Tabelle"),
+                dash_table.DataTable(
+                    id="scoreboard",
+                    columns=[
+                        {"name": "#", "id": "Platzierung"},
+                        {"name": "Team", "id": "Team"},
+                        {"name": "Punkte", "id": "Punkte"},
+                        {"name": "Elo", "id": "Elo"}
+                    ],
+                    data=snapshot.score_board.to_dict("records"),
+                    style_table={"overflowX": "auto", "width": "100%"},
+                    style_cell={"textAlign": "center", "minWidth": "100px", "whiteSpace": "normal"},
+                    row_selectable="single",
+                    selected_rows=[],
+                    tooltip_delay=0,
+                    tooltip_duration=None
+                ),
+
+                # Combined Graph
+                dcc.Graph(id="stacked-games-graph"),
+                dcc.Graph(id="relative-goals-graph"),
+
+                html.Br(),
+
+                # Gameplan
+                #html.H4("Spieleübersicht"),
+                dash_table.DataTable(
+                    id="gameplan",
+                    columns=[
+                        {"name": "Datum", "id": "Datum_Uhrzeit"},
+                        {"name": "Heim", "id": "Heim"},
+                        {"name": "Gast", "id": "Gast"},
+                        {"name": "Ergebnis", "id": "Ergebnis"}
+                    ],
+                    style_data_conditional=GAME_PLAN_STYLE,
+                    style_table={"overflowX": "auto", "width": "100%"},
+                    style_cell={"textAlign": "center", "minWidth": "100px", "whiteSpace": "normal"},
+                    **game_table_options
+                )
+            ])
         ]
+    )
 
-    df_score_board[["Tore_Gemacht", "Tore_Bekommen", "Tordifferenz"]] = df_score_board[["Tore_Gemacht", "Tore_Bekommen", "Tordifferenz"]].apply(pd.to_numeric, errors="coerce")
-    df_score_board.fillna(0, inplace=True)
+app.layout = serve_layout
 
+app.clientside_callback(
+    ClientsideFunction(namespace="dashboard", function_name="updateButton"),
+    [Output("update-button", "disabled"),
+     Output("update-icon", "children")],
+    [Input("snapshot-poll", "n_intervals"),
+     Input("snapshot-info", "data")]
+)
+
+# Team independent figures of a snapshot, serialized once
+def build_figures(df_score_board):
     # Stacked Games Chart
     fig_stacked_games = go.Figure()
     for outcome, color in zip(["Niederlagen", "Siege", "Offen"], ["#dc3545", "#28a745", "#6c757d"]):
@@ -239,26 +280,164 @@ def update_dashboard(selected_rows, data):
         xaxis_tickangle=80
     )
 
-    return table_style_data, table_format, games_data, game_plan_style_data, fig_stacked_games, fig_relative_goals
+    return fig_stacked_games.to_plotly_json(), fig_relative_goals.to_plotly_json()
+
+# Games shown in the game table for one team, or all games if team is None
+def game_list(snapshot, team):
+    if not team:
+        return snapshot.game_plan[["Datum_Uhrzeit", "Heim", "Gast", "Ergebnis", "Status"]]
+
+    df_team_plans_filtered = snapshot.team_plans.get(team, pd.DataFrame())
+    return df_team_plans_filtered[["Datum_Uhrzeit", "Heim", "Gast", "Ergebnis", "Ergebnis_Typ", "Spielort", "Status"]]
+
+def selected_team(selected_rows, data):
+    if selected_rows:
+        selected_index = selected_rows[0]
+        return data[selected_index]["Team"]
+    return None
+
+# Head-to-head matrices shipped to the browser for the scoreboard tooltips
+HEAD_TO_HEAD_FIELDS = ["games", "wins", "shoot_out_wins", "losses", "shoot_out_losses", "goals"]
+
+# Data the browser needs to switch between teams without a server round trip, built once per snapshot
+# Head-to-head matrices follow the teams list, the browser looks teams up by name, because its scoreboard
+# can come from another snapshot than the payloads, e.g. from a worker that did not see the last refresh yet
+def build_team_payloads(snapshot):
+    teams = list(snapshot.score_board["Team"])
+    matrices = data_matrix.matrices_for(snapshot)
+    rows = np.array([matrices.index.get(team, -1) for team in teams], dtype="int64")
+    known = rows >= 0
+
+    def aligned(matrix):
+        values = np.zeros((len(teams), len(teams)), dtype="int64")
+        values[np.ix_(known, known)] = matrix[np.ix_(rows[known], rows[known])]
+        return values.tolist()
+
+    payloads = {
+        "version": snapshot.version,
+        "game_plan_style": GAME_PLAN_STYLE,
+        "head_to_head": {
+            "teams": teams,
+            **{field: aligned(getattr(matrices, field)) for field in HEAD_TO_HEAD_FIELDS}
+        }
+    }
+
+    # Server side tables fetch their rows page by page
+    if not SERVER_SIDE_GAME_TABLE:
+        payloads["all_games"] = game_list(snapshot, None).to_dict("records")
+        payloads["team_games"] = {team: game_list(snapshot, team).to_dict("records") for team in snapshot.team_plans}
+
+    return payloads
+
+# Figures and team payloads only change with the snapshot, selecting a team is handled in the browser
+@app.callback(
+    [Output("team-payloads", "data"),
+     Output("stacked-games-graph", "figure"),
+     Output("relative-goals-graph", "figure")],
+    Input("scoreboard", "data")
+)
+@data_metrics.timed_callback("update_dashboard")
+def update_dashboard(data):
+    snapshot = refresher.current()
+
+    fig_stacked_games, fig_relative_goals = cached(
+        ("figures", snapshot.version), lambda: build_figures(snapshot.score_board)
+    )
+    payloads = cached(("payloads", snapshot.version), lambda: build_team_payloads(snapshot))
+
+    return payloads, fig_stacked_games, fig_relative_goals
+
+selection_outputs = [
+    Output("scoreboard", "style_data_conditional"),
+    Output("scoreboard", "tooltip_data"),
+    Output("gameplan", "style_data_conditional")
+]
+if not SERVER_SIDE_GAME_TABLE:
+    selection_outputs.append(Output("gameplan", "data"))
+
+app.clientside_callback(
+    ClientsideFunction(namespace="dashboard", function_name="selectTeam"),
+    selection_outputs,
+    [Input("scoreboard", "selected_rows"),
+     Input("team-payloads", "data")],
+    State("scoreboard", "data")
+)
+
+if SERVER_SIDE_GAME_TABLE:
+    @app.callback(
+        [Output("gameplan", "data"),
+         Output("gameplan", "page_count"),
+         Output("gameplan", "page_current")],
+        [Input("scoreboard", "selected_rows"),
+         Input("scoreboard", "data"),
+         Input("gameplan", "page_current"),
+         Input("gameplan", "page_size"),
+         Input("gameplan", "sort_by"),
+         Input("gameplan", "filter_query")]
+    )
+    @data_metrics.timed_callback("update_game_table")
+    def update_game_table(selected_rows, data, page_current, page_size, sort_by, filter_query):
+        snapshot = refresher.current()
+        team = selected_team(selected_rows, data)
+        # Another team or filter starts on the first page, a new snapshot keeps the page if it still exists
+        triggered = ctx.triggered_prop_ids
+        new_team = "scoreboard.selected_rows" in triggered and "scoreboard.data" not in triggered
+        if new_team or "gameplan.filter_query" in triggered:
+            page_current = 0
+
+        # Sort indexes are built once per snapshot and team, filters are cached per query
+        view, sort_indexes = cached(
+            ("view", snapshot.version, team), lambda: data_table.create_table_view(game_list(snapshot, team))
+        )
+        mask = None
+        if filter_query:
+            mask = cached(
+                ("filter", snapshot.version, team, filter_query), lambda: data_table.filter_mask(view, filter_query)
+            )
+
+        return data_table.table_page(view, sort_indexes, page_current or 0, page_size or GAME_TABLE_PAGE_SIZE, sort_by, mask)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="dashboard", function_name="checkVersion"),
+    [Output("snapshot-info", "data"),
+     Output("snapshot-version", "data"),
+     Output("update-info", "children")],
+    Input("snapshot-poll", "n_intervals"),
+    [State("snapshot-info", "data"),
+     State("snapshot-version", "data")],
+    prevent_initial_call=True
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="dashboard", function_name="rememberTeam"),
+    Output("selected-team", "data"),
+    Input("scoreboard", "selected_rows"),
+    State("scoreboard", "data")
+)
+
+# Score board data is only sent again when the browser saw a new version
+# The selected team keeps its selection in the new standings order
+@app.callback(
+    [Output("scoreboard", "data"),
+     Output("scoreboard", "selected_rows")],
+    Input("snapshot-version", "data"),
+    State("selected-team", "data"),
+    prevent_initial_call=True
+)
+@data_metrics.timed_callback("update_scoreboard")
+def update_scoreboard(version, team):
+    data = refresher.current().score_board.to_dict("records")
+    selected_rows = [i for i, row in enumerate(data) if row["Team"] == team][:1]
+
+    return data, selected_rows
 
+# Refresh runs in the background, the version check picks up the new snapshot
 @app.callback(
-    Output("update-info", "children"),
-    [Input("update-button", "n_clicks"),
-     Input("update-info", "id")]
+    Input("update-button", "n_clicks"),
+    prevent_initial_call=True
 )
-def update_info(n_clicks, _):
-    global df_game_plan, df_team_plans, df_team_stats, df_tabelle, last_update
-    ctx = callback_context
-    if not ctx.triggered:
-        # Initial call, just show timestamp
-        return f"Stand: {last_update.strftime('%d.%m.%Y %H:%M:%S')}"
-    trigger_id = ctx.triggered[0]["prop_id"].split(".")[0]
-    if trigger_id == "update-button":
-        df_game_plan, df_team_plans, df_team_stats, df_tabelle = data_handler.get_second_league()
-        last_update = datetime.datetime.now()
-        return f"Stand: {last_update.strftime('%d.%m.%Y %H:%M:%S')}"
-    # Otherwise, just return the current timestamp
-    return f"Stand: {last_update.strftime('%d.%m.%Y %H:%M:%S')}"
+def request_update(n_clicks):
+    refresher.request_refresh()
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8050, debug=True)
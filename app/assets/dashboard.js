@@ -0,0 +1,96 @@
+// dashboard.js
+
+// Selecting a team only changes what the browser shows, the data of all teams comes with the snapshot
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    dashboard: {
+        selectTeam: function(selectedRows, payloads, data) {
+            // Nothing to show before the payloads of the first snapshot arrive
+            if (!payloads) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            const highlight = "#e0f3ff";
+            const team = selectedRows && selectedRows.length && data && data[selectedRows[0]] ? data[selectedRows[0]].Team : null;
+
+            let tableStyle = [];
+            let tooltips = [];
+            let gamePlanStyle = payloads.game_plan_style.slice();
+
+            if (team) {
+                tableStyle = [
+                    {"if": {"filter_query": "{Team} = '" + team + "'"}, "backgroundColor": highlight}
+                ];
+                gamePlanStyle.push(
+                    {"if": {"filter_query": "{Heim} = '" + team + "'", "column_id": "Heim"}, "backgroundColor": highlight},
+                    {"if": {"filter_query": "{Gast} = '" + team + "'", "column_id": "Gast"}, "backgroundColor": highlight}
+                );
+
+                // Direct comparison with the team of every row, teams are looked up by name because
+                // the rows can be in another order than the matrices of the payloads
+                const h2h = payloads.head_to_head;
+                const index = {};
+                (h2h && h2h.teams ? h2h.teams : []).forEach(function(name, k) {
+                    index[name] = k;
+                });
+                const i = index[team];
+                tooltips = data.map(function(row) {
+                    const j = index[row.Team];
+                    if (i === undefined || j === undefined || i === j || !h2h.games[i][j]) {
+                        return {};
+                    }
+                    const text = team + " gegen " + row.Team + ": " + h2h.games[i][j] + " Spiele, "
+                        + (h2h.wins[i][j] + h2h.shoot_out_wins[i][j]) + " Siege (" + h2h.shoot_out_wins[i][j] + " nach 5m), "
+                        + (h2h.losses[i][j] + h2h.shoot_out_losses[i][j]) + " Niederlagen (" + h2h.shoot_out_losses[i][j] + " nach 5m), "
+                        + "Tore " + h2h.goals[i][j] + ":" + h2h.goals[j][i];
+                    return {"Team": {"value": text, "type": "text"}};
+                });
+            }
+
+            const outputs = [tableStyle, tooltips, gamePlanStyle];
+            // Without server side paging the game table switches between the shipped game lists
+            if (payloads.all_games !== undefined) {
+                outputs.push(team ? (payloads.team_games[team] || []) : payloads.all_games);
+            }
+            return outputs;
+        },
+
+        // Name of the selected team, the server selects its row again in the next standings
+        rememberTeam: function(selectedRows, data) {
+            if (!selectedRows || !selectedRows.length || !data || !data[selectedRows[0]]) {
+                return null;
+            }
+            return data[selectedRows[0]].Team;
+        },
+
+        // Asks the server whether the snapshot changed, new data is only requested for a new version
+        checkVersion: async function(nIntervals, info, version) {
+            const noUpdate = window.dash_clientside.no_update;
+            let response;
+            try {
+                response = await fetch("snapshot-version", {
+                    cache: "no-store",
+                    headers: info && info.etag ? {"If-None-Match": '"' + info.etag + '"'} : {}
+                });
+            } catch (error) {
+                return [noUpdate, noUpdate, noUpdate];
+            }
+            if (response.status !== 200) {
+                return [noUpdate, noUpdate, noUpdate];
+            }
+
+            const current = await response.json();
+            return [
+                current,
+                current.version !== version ? current.version : noUpdate,
+                !info || current.info !== info.info ? current.info : noUpdate
+            ];
+        },
+
+        // The update button stays locked for a while after every snapshot
+        updateButton: function(nIntervals, info) {
+            if (info && Date.now() / 1000 < info.update_allowed_at) {
+                return [true, "🕒"];
+            }
+            return [false, ""];
+        }
+    }
+});
@@ -0,0 +1,16 @@
+# wsgi.py
+#
+# Production entry point with several workers, e.g.
+#   python -m data.data_snapshot &
+#   gunicorn --preload --workers 4 --bind 0.0.0.0:8050 app.wsgi:server
+# Only the refresher process scrapes DSV, the workers serve the snapshots it persists.
+# The refresher serves its metrics on DSV_METRICS_PORT (9108), the workers' /metrics has the callback metrics.
+# With --preload the workers share the imported modules and the first snapshot with the master.
+
+import os
+
+os.environ.setdefault("DSV_SNAPSHOT_ROLE", "worker")
+
+from app.app import app
+
+server = app.server
@@ -0,0 +1,41 @@
+# bench_parser.py
+#
+# Compares the speed of the parser backends on the saved league pages.
+# Run from the repository root: python -m benchmarks.bench_parser
+
+import glob
+import os
+import timeit
+
+from bs4 import BeautifulSoup
+
+import data.data_parser as data_parser
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+REPEAT = 5
+
+# Full page tree as built before the parser backends existed
+def parse_full_soup(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return data_parser.parse_game_plan(soup), data_parser.parse_score_board(soup)
+
+def main():
+    backends = {"full soup": parse_full_soup}
+    backends["soup"] = lambda html: data_parser.parse_league_page(html, backend="soup")
+    if data_parser.lxml is not None:
+        backends["lxml"] = lambda html: data_parser.parse_league_page(html, backend="lxml")
+
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "league_*.html"))):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+
+        expected = parse_full_soup(html)
+        print(f"{os.path.basename(path)} ({len(html) / 1024:.0f} KiB, {len(expected[0])} games)")
+
+        # tests/test_data_parser.py checks that every backend produces the same dataframes
+        for name, parse in backends.items():
+            seconds = min(timeit.repeat(lambda: parse(html), number=1, repeat=REPEAT))
+            print(f"  {name:<10} {seconds * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# bench_pipeline.py
+#
+# Times the refresh pipeline and the dashboard callback on synthetic leagues of several sizes.
+# Run from the repository root: python -m benchmarks.bench_pipeline [--teams 8 16 40] [--compare old.json]
+
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import timeit
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+import benchmarks.generators as generators
+import data.data_handler as data_handler
+import data.data_operator as data_operator
+import data.data_parser as data_parser
+import data.data_protocol as data_protocol
+import data.data_schema as data_schema
+
+SCALES = [8, 16, 40, 120]
+REPEAT = 5
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# League the app is served instead of the scraped second league
+_league = {}
+
+def _synthetic_scrape(url_league):
+    return _league["game_plan"].copy(), _league["score_board"].copy()
+
+def _no_protocols(df_game_plan, base_url, max_workers=None, fetch=True):
+    return pd.DataFrame(columns=["Spielnummer"] + data_protocol.EVENT_COLUMNS)
+
+# The app starts scraping when it is imported, so it gets the synthetic league and never refreshes on its own
+def load_app():
+    os.environ["DSV_PERSIST_SNAPSHOTS"] = "0"
+    os.environ["DSV_RECORD_HISTORY"] = "0"
+    os.environ["DSV_PERSIST_RATINGS"] = "0"
+    os.environ["DSV_REFRESH_INTERVAL"] = str(365 * 24 * 60 * 60)
+    data_handler.scrape_data_to_df = _synthetic_scrape
+    data_protocol.get_protocols = _no_protocols
+    _league["game_plan"] = generators.generate_league(4)
+    _league["score_board"] = generators.generate_score_board(_league["game_plan"])
+
+    app = importlib.import_module("app.app")
+    app.refresher.current()
+
+    return app
+
+def time_stage(func, repeat):
+    runs = timeit.repeat(func, number=1, repeat=repeat)
+    return {"min": min(runs), "median": statistics.median(runs)}
+
+def bench_league(app, n_teams, repeat):
+    html, df_raw_game_plan, df_raw_score_board = generators.generate_league_page(n_teams, seed=n_teams)
+    soup = BeautifulSoup(html, "html.parser")
+    # Stages get their input in the schema the pipeline hands them
+    df_game_plan = data_operator.extend_game_plan(df_raw_game_plan)
+    dtypes = data_schema.league_dtypes(df_game_plan)
+    df_game_plan = data_schema.compact_frame(df_game_plan, dtypes)
+    df_team_plans = data_operator.create_team_plans(df_game_plan, dtypes)
+
+    stages = {
+        "parse_league_page": lambda: data_parser.parse_league_page(html),
+        "parse_game_plan": lambda: data_parser.parse_game_plan(soup),
+        "parse_score_board": lambda: data_parser.parse_score_board(soup),
+        "extend_game_plan": lambda: data_operator.extend_game_plan(df_raw_game_plan),
+        "create_team_plans": lambda: data_operator.create_team_plans(df_game_plan, dtypes),
+        "create_team_stats": lambda: data_operator.create_team_stats(df_team_plans),
+        "extend_score_board": lambda: data_operator.extend_score_board(df_raw_score_board.copy())
+    }
+    results = {name: time_stage(func, repeat) for name, func in stages.items()}
+
+    # Dashboard callback on a snapshot of this league, selecting a team runs in the browser
+    _league["game_plan"], _league["score_board"] = df_raw_game_plan, df_raw_score_board
+    snapshot = app.data_snapshot.build_snapshot()
+    app.refresher.publish(snapshot)
+    data = snapshot.score_board.to_dict("records")
+
+    def update_dashboard(cold):
+        if cold:
+            app._payload_cache.clear()
+            app.data_matrix._cache.clear()
+        return app.update_dashboard(data)
+
+    for cache, cold in [("cold", True), ("warm", False)]:
+        update_dashboard(cold)
+        results[f"update_dashboard_{cache}"] = time_stage(lambda: update_dashboard(cold), repeat)
+
+    return {"teams": n_teams, "games": len(df_raw_game_plan), "stages": results}
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(run, previous=None):
+    for scale, league in run["results"].items():
+        print(f"{league['teams']} teams, {league['games']} games")
+        for name, timing in league["stages"].items():
+            line = f"  {name:<30} {timing['median'] * 1000:10.2f} ms"
+            old = (previous or {}).get("results", {}).get(scale, {}).get("stages", {}).get(name)
+            if old:
+                line += f"  {timing['median'] / old['median']:6.2f}x"
+            print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the refresh pipeline on synthetic leagues")
+    parser.add_argument("--teams", type=int, nargs="+", default=SCALES, help="league sizes in teams")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--output", help="result file, defaults to a new file in benchmarks/results")
+    parser.add_argument("--compare", help="earlier result file, prints the time relative to it")
+    args = parser.parse_args()
+
+    app = load_app()
+    run = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "parser_backend": data_parser.PARSER_BACKEND,
+        "compact_frames": data_schema.COMPACT_FRAMES,
+        "repeat": args.repeat,
+        "results": {str(n_teams): bench_league(app, n_teams, args.repeat) for n_teams in args.teams}
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    print_results(run, previous)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"pipeline-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# generators.py
+#
+# Synthetic leagues and matching DSV-style league pages for the benchmarks.
+
+import html
+import random
+
+import pandas as pd
+
+import data.data_parser as data_parser
+
+# Points for a win, a win after 5m shoot-out, a loss after 5m shoot-out and a loss
+POINTS = {"Sieg": 3, "Sieg nach 5m": 2, "Niederlage nach 5m": 1, "Niederlage": 0}
+
+VENUES = ["Hallenbad Nord", "Stadtbad", "Sportbad am Park", "Freibad West", "Schwimmhalle Süd"]
+
+def team_names(n_teams):
+    return [f"SV Wasserball {i + 1:03d}" for i in range(n_teams)]
+
+# Function to generate the raw game plan of a round-robin league as parsed from a league page
+# open_share of the games are not played yet, unknown_date_share have no date yet
+# and shoot_out_share of the drawn games are decided by a 5m shoot-out
+def generate_league(n_teams, rounds=2, seed=0, open_share=0.25, unknown_date_share=0.05, shoot_out_share=0.5):
+    rnd = random.Random(seed)
+    teams = team_names(n_teams)
+    venues = {team: rnd.choice(VENUES) for team in teams}
+    games = {col: [] for col in data_parser.GAMEPLAN_COLUMNS}
+
+    number = 1
+    for r in range(rounds):
+        for i, home in enumerate(teams):
+            for j, away in enumerate(teams):
+                # Every pair meets once per round, home and away alternate
+                if i == j or (i < j) != (r % 2 == 0):
+                    continue
+
+                if rnd.random() < unknown_date_share:
+                    date_time = "n.n."
+                else:
+                    month = rnd.choice([1, 2, 3, 4, 10, 11, 12])
+                    date_time = f"{rnd.randint(1, 28):02d}.{month:02d}.24, {rnd.randint(10, 20):02d}:{rnd.choice(['00', '30'])} Uhr"
+
+                result, quarters, link = "", "", ""
+                if date_time != "n.n." and rnd.random() >= open_share:
+                    scores = [(rnd.randint(0, 5), rnd.randint(0, 5)) for _ in range(4)]
+                    home_goals = sum(score[0] for score in scores)
+                    away_goals = sum(score[1] for score in scores)
+                    if home_goals == away_goals and rnd.random() < shoot_out_share:
+                        shoot_out = rnd.randint(2, 5)
+                        scores.append((shoot_out, shoot_out + rnd.choice([-1, 1])))
+                    result = f"{sum(s[0] for s in scores)}:{sum(s[1] for s in scores)}"
+                    if len(scores) == 5:
+                        result += " n.EW"
+                    quarters = "(" + ", ".join(f"{a}:{b}" for a, b in scores) + ")"
+                    link = f"Game.aspx?Season=2024&GameID={number}"
+
+                games["Spielnummer"].append(str(number))
+                games["Datum & Uhrzeit"].append(date_time)
+                games["Heim"].append(home)
+                games["Gast"].append(away)
+                games["Ort"].append(venues[home])
+                games["Ergebnis"].append(result)
+                games["Viertel"].append(quarters)
+                games["Protokoll"].append(link)
+                number += 1
+
+    return pd.DataFrame(games)
+
+# Function to generate the raw score board that belongs to a generated game plan
+def generate_score_board(df_game_plan):
+    teams = pd.unique(df_game_plan[["Heim", "Gast"]].values.ravel())
+    table = {team: {"Gespielt": 0, "Gesamt": 0, "Siege": 0, "Unentschieden": 0, "Niederlagen": 0,
+                    "Tore": 0, "Gegentore": 0, "Punkte": 0} for team in teams}
+
+    for home, away, result in zip(df_game_plan["Heim"], df_game_plan["Gast"], df_game_plan["Ergebnis"]):
+        table[home]["Gesamt"] += 1
+        table[away]["Gesamt"] += 1
+        if not result:
+            continue
+
+        shoot_out = result.endswith("n.EW")
+        home_goals, away_goals = (int(goals) for goals in result.replace(" n.EW", "").split(":"))
+        for team, own, against in [(home, home_goals, away_goals), (away, away_goals, home_goals)]:
+            row = table[team]
+            row["Gespielt"] += 1
+            row["Tore"] += own
+            row["Gegentore"] += against
+            if own == against:
+                row["Unentschieden"] += 1
+                row["Punkte"] += 1
+                continue
+            outcome = ("Sieg" if own > against else "Niederlage") + (" nach 5m" if shoot_out else "")
+            row["Siege" if own > against else "Niederlagen"] += 1
+            row["Punkte"] += POINTS[outcome]
+
+    ranking = sorted(teams, key=lambda team: (-table[team]["Punkte"], table[team]["Gegentore"] - table[team]["Tore"], team))
+    rows = []
+    for place, team in enumerate(ranking, start=1):
+        row = table[team]
+        rows.append({
+            "Platzierung": f"{place}.",
+            "Team": team,
+            "Spiele": f"{row['Gespielt']} / {row['Gesamt']}",
+            "Siege": str(row["Siege"]),
+            "Unentschieden": str(row["Unentschieden"]),
+            "Niederlagen": str(row["Niederlagen"]),
+            "Tore": f"{row['Tore']} : {row['Gegentore']}",
+            "Tordifferenz": str(row["Tore"] - row["Gegentore"]),
+            "Punkte": str(row["Punkte"])
+        })
+
+    return pd.DataFrame(rows)
+
+def _cell(text):
+    return f"<td>{html.escape(text) if text else '&nbsp;'}</td>"
+
+# Function to render a game plan and score board as a DSV league page
+def league_page(df_game_plan, df_score_board, title="Synthetische Liga 2024", seed=0):
+    rnd = random.Random(seed)
+    # The real pages carry a large view state, it is part of what the parser has to skip
+    view_state = "".join(rnd.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/") for _ in range(6000))
+
+    game_rows = []
+    for index, game in enumerate(df_game_plan.itertuples(index=False)):
+        date_time = html.escape(game[1]).replace(", ", ",<br>")
+        if game.Protokoll:
+            result = f'<td><a href="{html.escape(game.Protokoll)}" target="_blank">{html.escape(game.Ergebnis)}</a></td>'
+        else:
+            result = _cell(game.Ergebnis)
+        game_rows.append(
+            f'\t<tr class="{"odd" if index % 2 else "even"}">\n'
+            f"\t\t<td>{game.Spielnummer}</td><td>{date_time}</td>{_cell(game.Heim)}{_cell(game.Gast)}\n"
+            f"\t\t{_cell(game.Ort)}{result}{_cell(game.Viertel)}\n"
+            "\t</tr>"
+        )
+
+    score_rows = []
+    for team in df_score_board.itertuples(index=False):
+        cells = [team.Platzierung, team.Team, team.Spiele, team.Siege, team.Unentschieden,
+                 team.Niederlagen, team.Tore, team.Tordifferenz, team.Punkte]
+        score_rows.append("\t<tr>\n\t\t" + "".join(_cell(cell) for cell in cells).replace(" / ", "&nbsp;/&nbsp;").replace(" : ", "&nbsp;:&nbsp;") + "\n\t</tr>")
+
+    newline = "\n"
+    return f"""<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml">
+<head><title>DSV - Wasserball - {html.escape(title)}</title>
+<link href="/App_Themes/Default/style.css" rel="stylesheet" type="text/css" />
+</head>
+<body>
+<form name="aspnetForm" method="post" action="./League.aspx" id="aspnetForm">
+<div><input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{view_state}" /></div>
+<table class="navigation">
+\t<tr><td><a href="/Modules/WB/Index.aspx">Wasserball</a></td><td><a href="/Modules/WB/League.aspx">Ligen</a></td></tr>
+</table>
+<h2>{html.escape(title)}</h2>
+<table class="gameplan" cellspacing="0">
+\t<tr><th colspan="7">Spielplan</th></tr>
+\t<tr><th>Nr.</th><th>Datum</th><th>Heim</th><th>Gast</th><th>Ort</th><th>Ergebnis</th><th>Viertel</th></tr>
+{newline.join(game_rows)}
+</table>
+<h3>Tabelle</h3>
+<table class="scoreboard" cellspacing="0">
+\t<tr><th>Pl.</th><th>Mannschaft</th><th>Spiele</th><th>S</th><th>U</th><th>N</th><th>Tore</th><th>Diff.</th><th>Punkte</th></tr>
+{newline.join(score_rows)}
+</table>
+</form>
+</body>
+</html>
+"""
+
+# Function to generate a league and its page
+def generate_league_page(n_teams, rounds=2, seed=0, **kwargs):
+    df_game_plan = generate_league(n_teams, rounds=rounds, seed=seed, **kwargs)
+    df_score_board = generate_score_board(df_game_plan)
+
+    return league_page(df_game_plan, df_score_board, seed=seed), df_game_plan, df_score_board
@@ -0,0 +1,132 @@
+# data_export.py
+#
+# Exports game plans, team plans, team stats and score boards of DSV leagues without the dashboard.
+# Run from the repository root:
+#   python -m data.data_export --league 2024:77::17 --league 2024:78::17 --format parquet --output exports
+# Only leagues whose page changed since the last export into the same directory are processed again,
+# so the export can run every minute.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+import data.data_handler as data_handler
+
+FORMATS = ["parquet", "csv"]
+FRAMES = ["game_plan", "team_plans", "team_stats", "score_board"]
+# Page digests of the last export, next to the exported leagues
+DIGEST_FILE = "digests.json"
+
+# Function to parse a league given as SEASON:LEAGUE_ID[:GROUP[:STATE_ID]]
+def parse_league(text):
+    parts = text.split(":")
+    if not 2 <= len(parts) <= 4:
+        raise argparse.ArgumentTypeError(f"League must be SEASON:LEAGUE_ID[:GROUP[:STATE_ID]], got {text!r}")
+    try:
+        season, league_id = int(parts[0]), int(parts[1])
+        group = parts[2] if len(parts) > 2 else ""
+        state_id = int(parts[3]) if len(parts) > 3 and parts[3] else 0
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Season, league and state must be numbers, got {text!r}")
+
+    return data_handler.League(season, league_id, group, state_id)
+
+def league_name(league):
+    return f"{league.season}_{league.league_id}_{league.group or '-'}_{league.state_id}"
+
+def _read_leagues(path):
+    with open(path, encoding="utf-8") as f:
+        return [parse_league(line.strip()) for line in f if line.strip() and not line.startswith("#")]
+
+def load_digests(output):
+    try:
+        with open(os.path.join(output, DIGEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_digests(output, digests):
+    fd, tmp_path = tempfile.mkstemp(dir=output, prefix=".")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(digests, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(output, DIGEST_FILE))
+
+def _write_frame(df, path, fmt):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".")
+    os.close(fd)
+    try:
+        if fmt == "parquet":
+            df.to_parquet(tmp_path, index=False)
+        else:
+            df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+# Function to write the frames of a processed league, team plans are stacked into one table
+def export_league(frames, directory, fmt, names=None):
+    os.makedirs(directory, exist_ok=True)
+    for name, value in zip(FRAMES, frames):
+        if names and name not in names:
+            continue
+        if isinstance(value, dict):
+            value = pd.concat(
+                [df.assign(Team=team) for team, df in value.items()], ignore_index=True
+            ) if value else pd.DataFrame({"Team": []})
+        _write_frame(value, os.path.join(directory, f"{name}.{fmt}"), fmt)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export DSV league data to Parquet or CSV files")
+    parser.add_argument("--league", type=parse_league, action="append", default=[],
+                        help="SEASON:LEAGUE_ID[:GROUP[:STATE_ID]], can be given several times")
+    parser.add_argument("--leagues-file", help="file with one league per line")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--output", default="exports", help="directory with one subdirectory per league")
+    parser.add_argument("--frames", nargs="+", choices=FRAMES, default=FRAMES)
+    parser.add_argument("--force", action="store_true", help="export leagues whose page did not change, too")
+    parser.add_argument("--fetch-workers", type=int, default=None)
+    parser.add_argument("--process-workers", type=int, default=None,
+                        help="processes for parsing, defaults to one per CPU for several leagues and none for one")
+    args = parser.parse_args(argv)
+
+    leagues = list(args.league)
+    if args.leagues_file:
+        leagues += _read_leagues(args.leagues_file)
+    leagues = list(dict.fromkeys(leagues)) or [data_handler.SECOND_LEAGUE]
+
+    process_workers = args.process_workers
+    if process_workers is None:
+        process_workers = data_handler.MAX_PROCESS_WORKERS if len(leagues) > 1 else 0
+
+    os.makedirs(args.output, exist_ok=True)
+    saved = load_digests(args.output)
+    digests = {league: None if args.force else saved.get(league_name(league)) for league in leagues}
+    results, errors = data_handler.get_leagues(leagues, args.fetch_workers, process_workers, digests)
+
+    for league, frames in results.items():
+        try:
+            export_league(frames, os.path.join(args.output, league_name(league)), args.format, args.frames)
+        except (OSError, ImportError, ValueError) as error:
+            errors[league] = error
+
+    # Failed leagues keep their old digest, so the next run tries them again
+    for league in leagues:
+        if league not in errors and digests.get(league) is not None:
+            saved[league_name(league)] = digests[league]
+    save_digests(args.output, saved)
+
+    for league, error in errors.items():
+        print(f"{league_name(league)}: {type(error).__name__}: {error}", file=sys.stderr)
+    exported = sum(league not in errors for league in results)
+    unchanged = sum(league not in results and league not in errors for league in leagues)
+    print(f"{exported} exported, {unchanged} unchanged, {len(errors)} failed")
+
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,186 @@
 # data_handler.py
 
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from urllib.parse import urlencode
+
 import data.data_scraper as data_scraper
 import data.data_parser as data_parser
 import data.data_operator as data_operator
+import data.data_schema as data_schema
+import data.data_metrics as data_metrics
+import data.data_singleflight as data_singleflight
 
-URL_SECOND_LEAGUE = "https://dsvdaten.dsv.de/Modules/WB/League.aspx?Season=2024&LeagueID=77&Group=&LeagueKind=L&StateID=17"
+DSV_LEAGUE_URL = "https://dsvdaten.dsv.de/Modules/WB/League.aspx"
 
-def scrape_data_to_df(url_league):
+# Concurrency limits for scraping many leagues
+MAX_FETCH_WORKERS = int(os.environ.get("DSV_FETCH_WORKERS", 8))
+MAX_PROCESS_WORKERS = int(os.environ.get("DSV_PROCESS_WORKERS", os.cpu_count() or 1))
+
+League = namedtuple("League", ["season", "league_id", "group", "state_id"])
+
+def league_url(league):
+    query = urlencode({
+        "Season": league.season,
+        "LeagueID": league.league_id,
+        "Group": league.group,
+        "LeagueKind": "L",
+        "StateID": league.state_id
+    })
+    return f"{DSV_LEAGUE_URL}?{query}"
+
+SECOND_LEAGUE = League(2024, 77, "", 17)
+URL_SECOND_LEAGUE = league_url(SECOND_LEAGUE)
+
+# Last parsed dataframes per url, keyed by page digest
+_parsed_pages = {}
+
+# Concurrent scrapes of the same league share one fetch and parse
+_scrapes = data_singleflight.SingleFlight("scrape")
+
+def _fetch_and_parse(url_league):
     # Scrape data from the website
-    soup = data_scraper.scrape_dsv(url_league)
-    
-    # Parse into dataframes
-    df_game_plan = data_parser.parse_game_plan(soup)
-    df_score_board = data_parser.parse_score_board(soup)
+    with data_metrics.stage("fetch"):
+        page = data_scraper.fetch_dsv(url_league)
+
+    # Skip parsing if the page did not change since the last scrape
+    parsed = _parsed_pages.get(url_league)
+    data_metrics.cache_lookup("parsed_page", parsed is not None and parsed[0] == page.digest)
+    if parsed is None or parsed[0] != page.digest:
+        # Parse into dataframes
+        with data_metrics.stage("parse"):
+            parsed = (page.digest, *data_parser.parse_league_page(page.text))
+        _parsed_pages[url_league] = parsed
+
+    return parsed
+
+def scrape_data_to_df(url_league):
+    parsed = _scrapes.do(url_league, _fetch_and_parse, url_league)
+
+    # Every caller gets its own copies, the shared frames stay untouched
+    df_game_plan, df_score_board = parsed[1].copy(), parsed[2].copy()
     
     return df_game_plan, df_score_board
 
 def extend_game_plan_and_score_board(df_game_plan, df_score_board):
     # Extend game plan with additional information
-    df_game_plan = data_operator.extend_game_plan(df_game_plan)
+    with data_metrics.stage("extend"):
+        df_game_plan = data_operator.extend_game_plan(df_game_plan)
+        # Compact dtypes are set before the team plans are split off, so all plans share them
+        dtypes = data_schema.league_dtypes(df_game_plan)
+        df_game_plan = data_schema.compact_frame(df_game_plan, dtypes)
     
     # Create team plans and stats
-    df_team_plans = data_operator.create_team_plans(df_game_plan)
-    df_team_stats = data_operator.create_team_stats(df_team_plans)
+    with data_metrics.stage("team_plans"):
+        df_team_plans = data_operator.create_team_plans(df_game_plan, dtypes)
+    with data_metrics.stage("team_stats"):
+        df_team_stats = data_schema.compact_frame(data_operator.create_team_stats(df_team_plans), dtypes)
 
-    df_score_board = data_operator.extend_score_board(df_score_board)
+    with data_metrics.stage("score_board"):
+        df_score_board = data_operator.extend_score_board(df_score_board)
     
     return df_game_plan, df_team_plans, df_team_stats, df_score_board
 
+# Function to update previously extended data with a new scrape
+# previous holds the raw game plan, game plan, team plans and team stats of the last run
+def update_game_plan_and_score_board(previous, df_game_plan, df_score_board):
+    if previous is None:
+        return extend_game_plan_and_score_board(df_game_plan, df_score_board)
+    df_old_raw, df_old_game_plan, old_team_plans, old_team_stats = previous
+
+    # Only changed games are extended again, only their teams get new plans and stats
+    with data_metrics.stage("extend"):
+        df_game_plan, teams = data_operator.update_game_plan(df_old_raw, df_old_game_plan, df_game_plan)
+        dtypes = data_schema.league_dtypes(df_game_plan)
+        df_game_plan = data_schema.compact_frame(df_game_plan, dtypes)
+    with data_metrics.stage("team_plans"):
+        df_team_plans = data_operator.update_team_plans(df_game_plan, old_team_plans, teams, dtypes)
+    with data_metrics.stage("team_stats"):
+        df_team_stats = data_schema.compact_frame(data_operator.update_team_stats(df_team_plans, old_team_stats, teams), dtypes)
+
+    with data_metrics.stage("score_board"):
+        df_score_board = data_operator.extend_score_board(df_score_board)
+
+    return df_game_plan, df_team_plans, df_team_stats, df_score_board
+
+# Function to parse and extend a scraped league page, runs in a worker process
+# Returns the processed data and the stage timings, metrics of worker processes stay in the worker
+# otherwise, so the parent records them
+def process_league_page(html):
+    with data_metrics.recorded_stages() as timings:
+        with data_metrics.stage("parse"):
+            df_game_plan, df_score_board = data_parser.parse_league_page(html)
+        processed = extend_game_plan_and_score_board(df_game_plan, df_score_board)
+
+    return processed, timings
+
+# Last processed league per url, keyed by page digest
+_processed_leagues = {}
+
+def _fetch_league(league):
+    url = league_url(league)
+    with data_scraper.host_limit(url), data_metrics.stage("fetch"):
+        return data_scraper.fetch_dsv(url)
+
+# Function to get data from many leagues concurrently
+# Returns the processed data per league and the errors of leagues that failed
+# digests maps leagues to the page digest of an earlier run, leagues whose page is unchanged are
+# left out of the results, the digests of all fetched pages are written back to it
+def get_leagues(leagues, max_fetch_workers=None, max_process_workers=None, digests=None):
+    max_fetch_workers = max_fetch_workers or MAX_FETCH_WORKERS
+    max_process_workers = MAX_PROCESS_WORKERS if max_process_workers is None else max_process_workers
+    results = {}
+    errors = {}
+    processing = {}
+
+    process_pool = ProcessPoolExecutor(max_process_workers) if max_process_workers > 0 else None
+    try:
+        with ThreadPoolExecutor(max_fetch_workers) as fetch_pool:
+            fetches = {fetch_pool.submit(_fetch_league, league): league for league in leagues}
+
+            # Hand every page to the process pool as soon as it arrives
+            for future in as_completed(fetches):
+                league = fetches[future]
+                try:
+                    page = future.result()
+                except Exception as error:
+                    errors[league] = error
+                    continue
+
+                if digests is not None:
+                    unchanged = digests.get(league) == page.digest
+                    digests[league] = page.digest
+                    if unchanged:
+                        continue
+
+                processed = _processed_leagues.get(page.url)
+                data_metrics.cache_lookup("processed_league", processed is not None and processed[0] == page.digest)
+                if processed is not None and processed[0] == page.digest:
+                    results[league] = processed[1]
+                elif process_pool is not None:
+                    processing[process_pool.submit(process_league_page, page.text)] = (league, page)
+                else:
+                    processing[fetch_pool.submit(process_league_page, page.text)] = (league, page)
+
+            for future in as_completed(processing):
+                league, page = processing[future]
+                try:
+                    results[league], timings = future.result()
+                except Exception as error:
+                    errors[league] = error
+                    continue
+                # Pages processed in the fetch threads are already recorded
+                if process_pool is not None:
+                    for name, seconds in timings:
+                        data_metrics.record_stage(name, seconds)
+                _processed_leagues[page.url] = (page.digest, results[league])
+    finally:
+        if process_pool is not None:
+            process_pool.shutdown()
+
+    return results, errors
+
 # Function to get data from the second league
 def get_second_league():
     # Get data from the second league
@@ -0,0 +1,282 @@
+# data_history.py
+
+import os
+import sqlite3
+
+import pandas as pd
+
+HISTORY_DB = os.environ.get(
+    "DSV_HISTORY_DB", os.path.join(os.path.expanduser("~"), ".cache", "wpanalysis", "history.sqlite3")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    season INTEGER NOT NULL,
+    league_id INTEGER NOT NULL,
+    grp TEXT NOT NULL,
+    state_id INTEGER NOT NULL,
+    spielnummer TEXT NOT NULL,
+    datum TEXT,
+    datum_uhrzeit TEXT,
+    heim TEXT NOT NULL,
+    gast TEXT NOT NULL,
+    ort TEXT,
+    ergebnis TEXT,
+    heim_tore INTEGER,
+    gast_tore INTEGER,
+    nach_5m INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    protokoll TEXT,
+    PRIMARY KEY (season, league_id, grp, state_id, spielnummer)
+);
+CREATE INDEX IF NOT EXISTS games_heim ON games (heim, season);
+CREATE INDEX IF NOT EXISTS games_gast ON games (gast, season);
+CREATE INDEX IF NOT EXISTS games_league ON games (league_id, season, grp);
+CREATE INDEX IF NOT EXISTS games_datum ON games (datum);
+
+CREATE TABLE IF NOT EXISTS quarter_scores (
+    season INTEGER NOT NULL,
+    league_id INTEGER NOT NULL,
+    grp TEXT NOT NULL,
+    state_id INTEGER NOT NULL,
+    spielnummer TEXT NOT NULL,
+    viertel INTEGER NOT NULL,
+    heim INTEGER,
+    gast INTEGER,
+    PRIMARY KEY (season, league_id, grp, state_id, spielnummer, viertel)
+);
+
+CREATE TABLE IF NOT EXISTS score_boards (
+    season INTEGER NOT NULL,
+    league_id INTEGER NOT NULL,
+    grp TEXT NOT NULL,
+    state_id INTEGER NOT NULL,
+    stand TEXT NOT NULL,
+    platzierung TEXT,
+    team TEXT NOT NULL,
+    gespielt INTEGER,
+    gesamt INTEGER,
+    siege INTEGER,
+    niederlagen INTEGER,
+    tore_gemacht INTEGER,
+    tore_bekommen INTEGER,
+    tordifferenz INTEGER,
+    punkte TEXT,
+    PRIMARY KEY (season, league_id, grp, state_id, stand, team)
+);
+CREATE INDEX IF NOT EXISTS score_boards_team ON score_boards (team, season);
+CREATE INDEX IF NOT EXISTS score_boards_league ON score_boards (league_id, season, grp, stand);
+"""
+
+def connect(path=None):
+    path = path or HISTORY_DB
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+
+    return conn
+
+def _int_or_none(value):
+    return None if pd.isna(value) else int(value)
+
+# Function to bulk load an extended game plan of a league
+def store_game_plan(conn, league, df_game_plan):
+    key = tuple(league)
+    date_time = pd.to_datetime(df_game_plan["Datum_Uhrzeit"], format="%d.%m.%Y, %H:%M", errors="coerce")
+    dates = pd.to_datetime(df_game_plan["Datum"], errors="coerce")
+    after_5m = df_game_plan["Q5_Heim"].notna() | df_game_plan["Q5_Gast"].notna()
+
+    games = [
+        key + (
+            number,
+            None if pd.isna(date) else date.strftime("%Y-%m-%d"),
+            None if pd.isna(moment) else moment.strftime("%Y-%m-%d %H:%M"),
+            home, away, place, result,
+            _int_or_none(home_goals), _int_or_none(away_goals),
+            int(shoot_out), status, link
+        )
+        for number, date, moment, home, away, place, result, home_goals, away_goals, shoot_out, status, link in zip(
+            df_game_plan["Spielnummer"], dates, date_time, df_game_plan["Heim"], df_game_plan["Gast"],
+            df_game_plan["Ort"], df_game_plan["Ergebnis"], df_game_plan["Heim_Tore"], df_game_plan["Gast_Tore"],
+            after_5m, df_game_plan["Status"], df_game_plan["Protokoll"]
+        )
+    ]
+
+    quarters = []
+    for i in range(1, 6):
+        played = df_game_plan[f"Q{i}_Heim"].notna() | df_game_plan[f"Q{i}_Gast"].notna()
+        rows = df_game_plan[played]
+        quarters.extend(
+            key + (number, i, _int_or_none(home), _int_or_none(away))
+            for number, home, away in zip(rows["Spielnummer"], rows[f"Q{i}_Heim"], rows[f"Q{i}_Gast"])
+        )
+
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", games)
+        conn.executemany("INSERT OR REPLACE INTO quarter_scores VALUES (?, ?, ?, ?, ?, ?, ?, ?)", quarters)
+
+# Function to store a score board, unchanged score boards are not stored again
+def store_score_board(conn, league, df_score_board, stand):
+    key = tuple(league)
+    rows = [
+        (place, team, _int_or_none(played), _int_or_none(total), _int_or_none(wins), _int_or_none(losses),
+         _int_or_none(goals), _int_or_none(against), _int_or_none(difference), points)
+        for place, team, played, total, wins, losses, goals, against, difference, points in zip(
+            df_score_board["Platzierung"], df_score_board["Team"], df_score_board["Gespielt"],
+            df_score_board["Gesamt"], df_score_board["Siege"], df_score_board["Niederlagen"],
+            pd.to_numeric(df_score_board["Tore_Gemacht"], errors="coerce"),
+            pd.to_numeric(df_score_board["Tore_Bekommen"], errors="coerce"),
+            pd.to_numeric(df_score_board["Tordifferenz"], errors="coerce"), df_score_board["Punkte"]
+        )
+    ]
+
+    last = conn.execute(
+        "SELECT platzierung, team, gespielt, gesamt, siege, niederlagen, tore_gemacht, tore_bekommen, tordifferenz, punkte "
+        "FROM score_boards WHERE season = ? AND league_id = ? AND grp = ? AND state_id = ? "
+        "AND stand = (SELECT MAX(stand) FROM score_boards WHERE season = ? AND league_id = ? AND grp = ? AND state_id = ?) "
+        "ORDER BY rowid",
+        key + key
+    ).fetchall()
+    if last == rows:
+        return False
+
+    stand = stand.strftime("%Y-%m-%d %H:%M:%S")
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO score_boards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [key + (stand,) + row for row in rows]
+        )
+    return True
+
+# Function to store the processed data of a league
+def store_league(conn, league, df_game_plan, df_score_board, stand):
+    store_game_plan(conn, league, df_game_plan)
+    store_score_board(conn, league, df_score_board, stand)
+
+def _filters(seasons=None, league_id=None):
+    clauses = []
+    params = {}
+    if seasons is not None:
+        names = [f"season_{i}" for i in range(len(seasons))]
+        clauses.append(f"season IN ({', '.join(':' + name for name in names)})")
+        params.update(zip(names, seasons))
+    if league_id is not None:
+        clauses.append("league_id = :league_id")
+        params["league_id"] = league_id
+
+    return clauses, params
+
+# Every game once from the home and once from the away perspective
+TEAM_PERSPECTIVE = """
+    SELECT season, league_id, grp, state_id, spielnummer, datum, datum_uhrzeit, heim, gast, ort, ergebnis, status,
+           nach_5m, heim AS team, 'Heim' AS spielort, heim_tore AS own, gast_tore AS against
+    FROM games
+    UNION ALL
+    SELECT season, league_id, grp, state_id, spielnummer, datum, datum_uhrzeit, heim, gast, ort, ergebnis, status,
+           nach_5m, gast AS team, 'Auswärts' AS spielort, gast_tore AS own, heim_tore AS against
+    FROM games
+"""
+
+RESULT_TYPE = """
+    CASE
+        WHEN own IS NULL OR against IS NULL OR own = against THEN 'Offen'
+        WHEN own > against THEN CASE WHEN nach_5m THEN 'Sieg nach 5m' ELSE 'Sieg' END
+        ELSE CASE WHEN nach_5m THEN 'Niederlage nach 5m' ELSE 'Niederlage' END
+    END
+"""
+
+# Function to query the games of one team from its perspective across seasons
+def query_team_plan(conn, team, seasons=None, league_id=None):
+    clauses, params = _filters(seasons, league_id)
+    # Both halves filter on the indexed team columns
+    where = " AND ".join(["team = :team"] + clauses)
+    query = f"""
+        SELECT season AS Saison, league_id AS Liga, grp AS Gruppe, spielnummer AS Spielnummer,
+               datum_uhrzeit AS Datum_Uhrzeit, heim AS Heim, gast AS Gast, ort AS Ort, ergebnis AS Ergebnis,
+               status AS Status, spielort AS Spielort, own AS Eigene_Tore, against AS Gegentore,
+               {RESULT_TYPE} AS Ergebnis_Typ
+        FROM ({TEAM_PERSPECTIVE})
+        WHERE {where}
+        ORDER BY datum_uhrzeit IS NULL, datum_uhrzeit, season, spielnummer
+    """
+    df = pd.read_sql_query(query, conn, params={"team": team, **params})
+    df["Datum_Uhrzeit"] = pd.to_datetime(df["Datum_Uhrzeit"]).dt.strftime("%d.%m.%Y, %H:%M")
+
+    return df
+
+# Function to query team statistics per season and league
+def query_team_stats(conn, seasons=None, league_id=None, team=None):
+    clauses, params = _filters(seasons, league_id)
+    if team is not None:
+        clauses.append("team = :team")
+        params["team"] = team
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    # Quarter differences are own minus conceded quarter goals. They differ from create_team_stats, whose
+    # Q*_Gast columns hold the team's own quarter goals, so its Q*_Tordifferenz are always 0
+    quarters = ",\n".join(
+        f"SUM(CASE WHEN viertel = {i} THEN own - against END) AS Q{i}_Tordifferenz" for i in range(1, 5)
+    )
+    query = f"""
+        WITH perspective AS ({TEAM_PERSPECTIVE}),
+        quarter_perspective AS (
+            SELECT season, league_id, grp, state_id, g.heim AS team, viertel, q.heim AS own, q.gast AS against
+            FROM quarter_scores q JOIN games g USING (season, league_id, grp, state_id, spielnummer)
+            UNION ALL
+            SELECT season, league_id, grp, state_id, g.gast AS team, viertel, q.gast AS own, q.heim AS against
+            FROM quarter_scores q JOIN games g USING (season, league_id, grp, state_id, spielnummer)
+        ),
+        quarter_stats AS (
+            SELECT season, league_id, grp, state_id, team, {quarters}
+            FROM quarter_perspective
+            {where}
+            GROUP BY season, league_id, grp, state_id, team
+        ),
+        game_stats AS (
+            SELECT season, league_id, grp, state_id, team,
+                   COUNT(*) AS Spiele_gesamt,
+                   SUM(status = 'Gespielt') AS Gespielt,
+                   SUM(status = 'Offen') AS Offen,
+                   SUM(own) AS Tore_ges,
+                   SUM(against) AS Gegentore_ges,
+                   ROUND(AVG(own), 2) AS "Ø Tore",
+                   ROUND(AVG(against), 2) AS "Ø Gegentore",
+                   SUM(own) - SUM(against) AS Tordifferenz,
+                   SUM({RESULT_TYPE} = 'Sieg') AS Siege,
+                   SUM({RESULT_TYPE} = 'Sieg nach 5m') AS "Siege nach 5m",
+                   SUM({RESULT_TYPE} = 'Niederlage nach 5m') AS "Niederlagen nach 5m",
+                   SUM({RESULT_TYPE} = 'Niederlage') AS Niederlagen
+            FROM perspective
+            {where}
+            GROUP BY season, league_id, grp, state_id, team
+        )
+        SELECT s.season AS Saison, s.league_id AS Liga, s.grp AS Gruppe, s.team AS Team,
+               s.Spiele_gesamt, s.Gespielt, s.Offen, s.Tore_ges, s.Gegentore_ges, s."Ø Tore", s."Ø Gegentore",
+               s.Tordifferenz,
+               COALESCE(q.Q1_Tordifferenz, 0) AS Q1_Tordifferenz, COALESCE(q.Q2_Tordifferenz, 0) AS Q2_Tordifferenz,
+               COALESCE(q.Q3_Tordifferenz, 0) AS Q3_Tordifferenz, COALESCE(q.Q4_Tordifferenz, 0) AS Q4_Tordifferenz,
+               s.Siege, s."Siege nach 5m", s."Niederlagen nach 5m", s.Niederlagen
+        FROM game_stats s
+        LEFT JOIN quarter_stats q USING (season, league_id, grp, state_id, team)
+        ORDER BY s.season, s.league_id, s.grp, s.team
+    """
+    return pd.read_sql_query(query, conn, params=params)
+
+# Function to query the stored score boards of a league or team over time
+def query_score_boards(conn, seasons=None, league_id=None, team=None):
+    clauses, params = _filters(seasons, league_id)
+    if team is not None:
+        clauses.append("team = :team")
+        params["team"] = team
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = f"""
+        SELECT season AS Saison, league_id AS Liga, grp AS Gruppe, stand AS Stand, platzierung AS Platzierung,
+               team AS Team, gespielt AS Gespielt, gesamt AS Gesamt, siege AS Siege, niederlagen AS Niederlagen,
+               tore_gemacht AS Tore_Gemacht, tore_bekommen AS Tore_Bekommen, tordifferenz AS Tordifferenz,
+               punkte AS Punkte
+        FROM score_boards
+        {where}
+        ORDER BY season, league_id, grp, stand, rowid
+    """
+    return pd.read_sql_query(query, conn, params=params)
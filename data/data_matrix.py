@@ -0,0 +1,158 @@
+# data_matrix.py
+
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+QUARTERS = 4
+
+# Matrices of the last snapshot versions, least recently used entries are dropped
+MATRIX_CACHE_SIZE = 8
+
+# Team x team matrices of the played games, entry [i, j] is team i against team j
+# quarter_diff holds one matrix per quarter with the goal difference of team i in that quarter
+# index maps a team name to its row and column
+Matrices = namedtuple("Matrices", [
+    "teams", "index", "games", "goals", "wins", "draws", "losses",
+    "quarter_diff", "shoot_out_wins", "shoot_out_losses"
+])
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Function to map the teams of a game plan to integer codes
+# Compact game plans already share one sorted team dictionary, otherwise the names are sorted
+def team_codes(df_game_plan):
+    home, away = df_game_plan["Heim"], df_game_plan["Gast"]
+    if isinstance(home.dtype, pd.CategoricalDtype) and home.dtype == away.dtype:
+        return home.cat.categories.to_numpy(dtype=object), home.cat.codes.to_numpy(), away.cat.codes.to_numpy()
+
+    codes, teams = pd.factorize(pd.concat([home, away], ignore_index=True), sort=True)
+    return np.asarray(teams, dtype=object), codes[:len(home)], codes[len(home):]
+
+def _goals(df, col):
+    if col not in df.columns:
+        return np.full(len(df), np.nan)
+    return df[col].to_numpy(dtype="float64", na_value=np.nan)
+
+# Scatter-add of the weights into a n x n matrix, one bincount over the flat cell index
+def _scatter(rows, cols, weights, n):
+    return np.bincount(rows * n + cols, weights=weights, minlength=n * n).reshape(n, n)
+
+# Function to build the team x team matrices of an extended game plan
+def build_matrices(df_game_plan):
+    teams, home, away = team_codes(df_game_plan)
+    n = len(teams)
+
+    home_goals, away_goals = _goals(df_game_plan, "Heim_Tore"), _goals(df_game_plan, "Gast_Tore")
+    played = ~np.isnan(home_goals) & ~np.isnan(away_goals) & (home >= 0) & (away >= 0) & (home != away)
+
+    # Every played game once from the home and once from the away perspective
+    rows = np.concatenate([home[played], away[played]]).astype("int64")
+    cols = np.concatenate([away[played], home[played]]).astype("int64")
+    own = np.concatenate([home_goals[played], away_goals[played]])
+    against = np.concatenate([away_goals[played], home_goals[played]])
+    shoot_out = np.tile(~np.isnan(_goals(df_game_plan, "Q5_Heim"))[played] | ~np.isnan(_goals(df_game_plan, "Q5_Gast"))[played], 2)
+
+    def count(mask):
+        return _scatter(rows, cols, mask.astype("float64"), n).astype("int64")
+
+    quarter_diff = np.empty((QUARTERS, n, n), dtype="int64")
+    for i in range(QUARTERS):
+        q_home = np.nan_to_num(_goals(df_game_plan, f"Q{i+1}_Heim")[played])
+        q_away = np.nan_to_num(_goals(df_game_plan, f"Q{i+1}_Gast")[played])
+        diff = np.concatenate([q_home - q_away, q_away - q_home])
+        quarter_diff[i] = _scatter(rows, cols, diff, n).astype("int64")
+
+    return Matrices(
+        teams=teams,
+        index={team: i for i, team in enumerate(teams)},
+        games=count(np.ones(len(rows), dtype=bool)),
+        goals=_scatter(rows, cols, own, n).astype("int64"),
+        wins=count((own > against) & ~shoot_out),
+        draws=count(own == against),
+        losses=count((own < against) & ~shoot_out),
+        quarter_diff=quarter_diff,
+        shoot_out_wins=count((own > against) & shoot_out),
+        shoot_out_losses=count((own < against) & shoot_out)
+    )
+
+# Function to get the matrices of a snapshot, built once per snapshot version
+def matrices_for(snapshot):
+    with _cache_lock:
+        if snapshot.version in _cache:
+            _cache.move_to_end(snapshot.version)
+            return _cache[snapshot.version]
+
+    matrices = build_matrices(snapshot.game_plan)
+    with _cache_lock:
+        _cache[snapshot.version] = matrices
+        while len(_cache) > MATRIX_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return matrices
+
+# Function to get the direct comparison of two teams, None if one of them has no games
+def head_to_head(matrices, team, opponent):
+    i, j = matrices.index.get(team), matrices.index.get(opponent)
+    if i is None or j is None:
+        return None
+
+    comparison = {
+        "Team": team,
+        "Gegner": opponent,
+        "Spiele": int(matrices.games[i, j]),
+        "Siege": int(matrices.wins[i, j]),
+        "Unentschieden": int(matrices.draws[i, j]),
+        "Niederlagen": int(matrices.losses[i, j]),
+        "Siege nach 5m": int(matrices.shoot_out_wins[i, j]),
+        "Niederlagen nach 5m": int(matrices.shoot_out_losses[i, j]),
+        "Tore": int(matrices.goals[i, j]),
+        "Gegentore": int(matrices.goals[j, i])
+    }
+    for q in range(QUARTERS):
+        comparison[f"Q{q+1}_Tordifferenz"] = int(matrices.quarter_diff[q, i, j])
+
+    return comparison
+
+# Function to get the direct comparison of a team with every other team, one row per opponent
+def head_to_head_table(matrices, team):
+    i = matrices.index.get(team)
+    if i is None:
+        return pd.DataFrame()
+
+    table = pd.DataFrame({
+        "Gegner": matrices.teams,
+        "Spiele": matrices.games[i],
+        "Siege": matrices.wins[i],
+        "Unentschieden": matrices.draws[i],
+        "Niederlagen": matrices.losses[i],
+        "Siege nach 5m": matrices.shoot_out_wins[i],
+        "Niederlagen nach 5m": matrices.shoot_out_losses[i],
+        "Tore": matrices.goals[i],
+        "Gegentore": matrices.goals[:, i]
+    })
+    for q in range(QUARTERS):
+        table[f"Q{q+1}_Tordifferenz"] = matrices.quarter_diff[q, i]
+
+    return table.drop(index=i).reset_index(drop=True)
+
+# Function to get the season totals of every team from the matrices, in the order of matrices.teams
+def team_totals(matrices):
+    totals = pd.DataFrame({
+        "Team": matrices.teams,
+        "Gespielt": matrices.games.sum(axis=1),
+        "Tore_ges": matrices.goals.sum(axis=1),
+        "Gegentore_ges": matrices.goals.sum(axis=0),
+        "Siege": matrices.wins.sum(axis=1),
+        "Unentschieden": matrices.draws.sum(axis=1),
+        "Niederlagen": matrices.losses.sum(axis=1),
+        "Siege nach 5m": matrices.shoot_out_wins.sum(axis=1),
+        "Niederlagen nach 5m": matrices.shoot_out_losses.sum(axis=1)
+    })
+    for q in range(QUARTERS):
+        totals[f"Q{q+1}_Tordifferenz"] = matrices.quarter_diff[q].sum(axis=1)
+
+    return totals
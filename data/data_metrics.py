@@ -0,0 +1,192 @@
+# data_metrics.py
+
+import cProfile
+import datetime
+import functools
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Profile every refresh, single refreshes can be profiled with SnapshotRefresher.request_refresh(profile=True)
+PROFILE_REFRESH = os.environ.get("DSV_PROFILE_REFRESH", "0") == "1"
+PROFILE_DIR = os.environ.get("DSV_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "wpanalysis_profiles"))
+# Port the refresher process of the multi-worker mode serves its metrics on, 0 turns it off
+METRICS_PORT = int(os.environ.get("DSV_METRICS_PORT", 9108))
+
+# Type and help text of every metric
+METRICS = {
+    "wpanalysis_stage_duration_seconds": ("summary", "Duration of the refresh pipeline stages"),
+    "wpanalysis_stage_last_duration_seconds": ("gauge", "Duration of the last run of every refresh pipeline stage"),
+    "wpanalysis_callback_duration_seconds": ("summary", "Duration of the Dash callbacks"),
+    "wpanalysis_fetched_bytes_total": ("counter", "Bytes of pages downloaded from DSV"),
+    "wpanalysis_fetch_errors_total": ("counter", "Failed requests to DSV"),
+    "wpanalysis_protocol_errors_total": ("counter", "Match protocols that could not be fetched or parsed"),
+    "wpanalysis_rate_limit_wait_seconds_total": ("counter", "Seconds requests waited for the rate limit of their host"),
+    "wpanalysis_coalesced_calls_total": ("counter", "Calls that shared the result of a call already in flight"),
+    "wpanalysis_cache_requests_total": ("counter", "Cache lookups by cache and result"),
+    "wpanalysis_cache_hit_ratio": ("gauge", "Share of cache lookups that were hits"),
+    "wpanalysis_rows": ("gauge", "Rows of the frames of the current snapshot"),
+    "wpanalysis_refreshes_total": ("counter", "Snapshot refreshes by result"),
+    "wpanalysis_snapshot_timestamp_seconds": ("gauge", "Time of the current snapshot")
+}
+
+_values = {}
+_lock = threading.Lock()
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + value
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _values[_key(name, labels)] = value
+
+# Summaries keep the number and the sum of all observations
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        count, total = _values.get(key, (0, 0.0))
+        _values[key] = (count + 1, total + value)
+
+def cache_lookup(cache, hit):
+    inc("wpanalysis_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+# Stage timings of the current thread, collected while a block runs in recorded_stages
+_recording = threading.local()
+
+def record_stage(name, seconds):
+    observe("wpanalysis_stage_duration_seconds", seconds, stage=name)
+    set_gauge("wpanalysis_stage_last_duration_seconds", seconds, stage=name)
+
+# Function to time a stage of the refresh pipeline
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        record_stage(name, seconds)
+        timings = getattr(_recording, "timings", None)
+        if timings is not None:
+            timings.append((name, seconds))
+
+# Function to collect the stage timings of a block as a list of (stage, seconds)
+# Worker processes return them, so the parent can record them in its own metrics
+@contextmanager
+def recorded_stages():
+    timings = []
+    _recording.timings = timings
+    try:
+        yield timings
+    finally:
+        _recording.timings = None
+
+# Decorator to time a Dash callback
+def timed_callback(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe("wpanalysis_callback_duration_seconds", time.perf_counter() - start, callback=name)
+        return wrapper
+    return decorator
+
+# Function to profile a block with cProfile, the stats are written to PROFILE_DIR
+# Only the calling thread is profiled
+@contextmanager
+def profiled(enabled, name="refresh"):
+    if not enabled:
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, f"{name}-{datetime.datetime.now():%Y%m%d-%H%M%S-%f}.prof"))
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+def _hit_ratios(values):
+    lookups = {}
+    for (name, labels), value in values.items():
+        if name != "wpanalysis_cache_requests_total":
+            continue
+        labels = dict(labels)
+        hits, total = lookups.get(labels["cache"], (0, 0))
+        lookups[labels["cache"]] = (hits + (value if labels["result"] == "hit" else 0), total + value)
+
+    return {
+        _key("wpanalysis_cache_hit_ratio", {"cache": cache}): hits / total
+        for cache, (hits, total) in lookups.items() if total
+    }
+
+# Function to render all metrics in the Prometheus text format
+def render():
+    with _lock:
+        values = dict(_values)
+    values.update(_hit_ratios(values))
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        samples = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+        if not samples:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if kind == "summary":
+                count, total = value
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Function to serve /metrics from a process without a web server, e.g. the refresher process
+def serve_metrics(port=None, host="0.0.0.0"):
+    port = METRICS_PORT if port is None else port
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+
+    return server
+
+def reset():
+    with _lock:
+        _values.clear()
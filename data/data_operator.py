@@ -4,25 +4,39 @@ import pandas as pd
 import numpy as np
 import re
 
+import data.data_schema as data_schema
+
 def clean_text(df):
     # Apply cleaning functions to all string columns
-    def clean_cell(x):
-        if not isinstance(x, str):
-            return x
-        return (
-            x.strip() # Whitespace
-             .replace("\u00a0", " ") # Non-breaking space
-             .replace("\n", " ") #Line breaks
+    df = df.copy()
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.infer_dtype(values, skipna=True) not in ("string", "mixed", "mixed-integer"):
+            continue
+        cleaned = (
+            values.str.strip() # Whitespace
+                  .str.replace("\u00a0", " ", regex=False) # Non-breaking space
+                  .str.replace("\n", " ", regex=False) # Line breaks
         )
-    df = df.map(clean_cell)
+        # Keep non-string cells as they are
+        df[col] = cleaned.where(cleaned.notna(), values)
 
     return df
 
 def split_quarters(df):
-    quarters_list = df["Viertel"].apply(lambda x: re.findall(r"(\d+):(\d+)", x))
+    quarters = df["Viertel"].reset_index(drop=True).str.extractall(r"(\d+):(\d+)").astype("int64")
+    rows = quarters.index.get_level_values(0)
+    matches = quarters.index.get_level_values("match")
     for i in range(5):
-        df[f"Q{i+1}_Heim"] = quarters_list.apply(lambda x: int(x[i][0]) if len(x) > i else np.nan)
-        df[f"Q{i+1}_Gast"] = quarters_list.apply(lambda x: int(x[i][1]) if len(x) > i else np.nan)
+        in_quarter = matches == i
+        for side, group in [("Heim", 0), ("Gast", 1)]:
+            goals = np.full(len(df), np.nan)
+            goals[rows[in_quarter]] = quarters[group].values[in_quarter]
+            goals = pd.Series(goals, index=df.index)
+            # Quarters every game has are plain integers
+            if len(goals) and goals.notna().all():
+                goals = goals.astype("int64")
+            df[f"Q{i+1}_{side}"] = goals
 
     return df
 
@@ -44,15 +58,11 @@ def split_date_time(df):
     df["Uhrzeit_str"] = df["Uhrzeit_str"].str.strip().str.replace(" uhr", "", case=False)
     # Convert to datetime
     df["Datum"] = pd.to_datetime(df["Datum_str"], format="%d.%m.%y", errors="coerce")
-    df["Uhrzeit"] = pd.to_datetime(df["Uhrzeit_str"], format="%H:%M", errors="coerce").dt.time
-    def combine_date_time(row):
-        if pd.notnull(row["Datum"]) and pd.notnull(row["Uhrzeit"]):
-            return pd.to_datetime(f"{row['Datum']} {row['Uhrzeit']}")
-        else:
-            return pd.NaT
+    time_of_day = pd.to_datetime(df["Uhrzeit_str"], format="%H:%M", errors="coerce")
+    df["Uhrzeit"] = time_of_day.dt.time
     # Combine date and time into a single column
-    df["Datum_Uhrzeit"] = df.apply(combine_date_time, axis=1)
-    df["Datum_Uhrzeit"] = pd.to_datetime(df["Datum_Uhrzeit"], errors="coerce").dt.strftime("%d.%m.%Y, %H:%M")
+    date_time = df["Datum"] + (time_of_day - time_of_day.dt.normalize())
+    df["Datum_Uhrzeit"] = date_time.dt.strftime("%d.%m.%Y, %H:%M")
     
     return df
 
@@ -64,17 +74,19 @@ def add_weekday(df):
     if "Datum" in df.columns:
         valid_dates = df["Datum"].notna()
 
+        weekend = df["Datum"].dt.weekday >= 5
+        day_type = pd.Series(np.where(weekend, "Wochenende", "Wochentag"), index=df.index)
+
         # Add weekday information
-        df.loc[valid_dates, "Wochentag"] = df.loc[valid_dates, "Datum"].dt.day_name()
-        df.loc[valid_dates, "Wochenende"] = df.loc[valid_dates, "Datum"].dt.weekday >= 5
-        df.loc[valid_dates, "Spieltagstyp"] = df.loc[valid_dates, "Wochenende"].apply(
-            lambda x: "Wochenende" if x else "Wochentag"
-        )
+        df["Wochentag"] = df["Datum"].dt.day_name().astype(object).where(valid_dates, None)
+        df["Wochenende"] = weekend.astype(object).where(valid_dates, None)
+        df["Spieltagstyp"] = day_type.astype(object).where(valid_dates, None)
 
     return df
 
 def add_game_status(df):
-    df["Status"] = df["Ergebnis"].apply(lambda x: "Gespielt" if ":" in str(x) else "Offen")
+    played = df["Ergebnis"].astype(str).str.contains(":", regex=False, na=False)
+    df["Status"] = np.where(played, "Gespielt", "Offen")
 
     return df
 
@@ -89,94 +101,206 @@ def extend_game_plan(df):
 
     return df
 
-def add_game_location(games, team):
-    games["Heimspiel"] = games["Heim"] == team
-    games["Auswaertsspiel"] = games["Gast"] == team
-    games["Spielort"] = games.apply(
-        lambda row: "Heim" if row["Heim"] == team else ("Auswärts" if row["Gast"] == team else None), axis=1)
-    
-    return games
+# Goals as float array, missing goals are NaN for any numeric column type
+def _goals(games, col):
+    return games[col].to_numpy(dtype="float64", na_value=np.nan)
 
-def add_goals(games, team):
-    games["Eigene_Tore"] = games.apply(
-        lambda row: row["Heim_Tore"] if row["Heim"] == team else row["Gast_Tore"], axis=1)
-    games["Gegentore"] = games.apply(
-        lambda row: row["Gast_Tore"] if row["Heim"] == team else row["Heim_Tore"], axis=1)
-    
-    return games
+# Goals of the home or the away column per game, goals without any missing value stay integers
+# like in the source columns, nullable goals are floats until the compact schema is applied
+def _pick_goals(games, is_home, home_col, away_col):
+    goals = np.where(is_home, _goals(games, home_col), _goals(games, away_col))
+    dtype = games[home_col].dtype
+    if dtype == games[away_col].dtype and isinstance(dtype, np.dtype) and dtype.kind in "iu":
+        return goals.astype(dtype)
+
+    return goals
+
+# Stack every game once from the home and once from the away perspective
+def create_team_perspective(df):
+    home = df.assign(Team=df["Heim"], Heimspiel=True)
+    away = df.assign(Team=df["Gast"], Heimspiel=False)
+    away = away[away["Gast"] != away["Heim"]]
+
+    games = pd.concat([home, away])
+    games["Spiel_Index"] = np.concatenate([np.arange(len(df)), np.flatnonzero(df["Gast"].values != df["Heim"].values)])
+    games = games.sort_values("Spiel_Index", kind="stable")
+
+    is_home = games["Heimspiel"].values
+    games["Auswaertsspiel"] = games["Gast"] == games["Team"]
+    games["Spielort"] = np.where(is_home, "Heim", "Auswärts")
+    games["Eigene_Tore"] = _pick_goals(games, is_home, "Heim_Tore", "Gast_Tore")
+    games["Gegentore"] = _pick_goals(games, is_home, "Gast_Tore", "Heim_Tore")
 
-def add_quarter_goals(games, team):
     for i in range(1, 5):
         q = f"Q{i}"
-        games[f"{q}_Eigene"] = games.apply(
-            lambda row: row[f"{q}_Heim"] if row["Heim"] == team else row[f"{q}_Gast"], axis=1)
-        games[f"{q}_Gast"] = games.apply(
-            lambda row: row[f"{q}_Gast"] if row["Gast"] == team else row[f"{q}_Heim"], axis=1)
-        
+        games[f"{q}_Eigene"] = _pick_goals(games, is_home, f"{q}_Heim", f"{q}_Gast")
+        # Kept as in the per-team plans: the column holds the team's own quarter goals
+        games[f"{q}_Gast"] = _pick_goals(games, is_home, f"{q}_Heim", f"{q}_Gast")
+
+    games = add_result_type(games)
+
     return games
 
 def add_result_type(games):
-    def ergebnis_typ(row):
-        if pd.isna(row["Eigene_Tore"]) or pd.isna(row["Gegentore"]):
-            return "Offen"
-        
-        # Check if game ended in a draw
-        hat_q5 = not pd.isna(row.get("Q5_Heim", np.nan)) or not pd.isna(row.get("Q5_Gast", np.nan))
-
-        if row["Eigene_Tore"] > row["Gegentore"]:
-            return "Sieg nach 5m" if hat_q5 else "Sieg"
-        elif row["Eigene_Tore"] < row["Gegentore"]:
-            return "Niederlage nach 5m" if hat_q5 else "Niederlage"
-        else:
-            return "Offen"
-            
-    games["Ergebnis_Typ"] = games.apply(ergebnis_typ, axis=1)
+    own = games["Eigene_Tore"]
+    against = games["Gegentore"]
+    hat_q5 = pd.Series(False, index=games.index)
+    for col in ["Q5_Heim", "Q5_Gast"]:
+        if col in games.columns:
+            hat_q5 |= games[col].notna()
+
+    games["Ergebnis_Typ"] = np.select(
+        [(own > against) & hat_q5, own > against, (own < against) & hat_q5, own < against],
+        ["Sieg nach 5m", "Sieg", "Niederlage nach 5m", "Niederlage"],
+        default="Offen"
+    )
 
     return games
 
 # Function to create game plans filtered by team
-def create_team_plans(df):
+# dtypes of the compact schema are applied once to all games before they are split by team
+def create_team_plans(df, dtypes=None):
     teams = pd.unique(df[["Heim", "Gast"]].values.ravel())
-    team_plans = {}
+    games = data_schema.compact_frame(create_team_perspective(df), dtypes or {})
+    columns = [col for col in games.columns if col not in ("Team", "Spiel_Index")]
 
+    team_plans = {}
+    groups = dict(list(games.groupby("Team", sort=False, observed=True)))
     for team in teams:
-        games = df[(df["Heim"] == team) | (df["Gast"] == team)].copy()
-
-        games = add_game_location(games, team)
-        games = add_goals(games, team)
-        games = add_quarter_goals(games, team)
-        games = add_result_type(games)
-        team_plans[team] = games
+        team_plans[team] = groups.get(team, games.iloc[0:0])[columns]
 
     return team_plans
 
 # Function to create team statistics
 def create_team_stats(df_team_plans):
-    stats_list = []
-
-    for team, games in df_team_plans.items():
-        stats = {
-            "Team": team,
-            "Spiele_gesamt": len(games),
-            "Gespielt": (games["Status"] == "Gespielt").sum(),
-            "Offen": (games["Status"] == "Offen").sum(),
-            "Tore_ges": games["Eigene_Tore"].sum(),
-            "Gegentore_ges": games["Gegentore"].sum(),
-            "Ø Tore": round(games["Eigene_Tore"].mean(), 2),
-            "Ø Gegentore": round(games["Gegentore"].mean(), 2),
-            "Tordifferenz": games["Eigene_Tore"].sum() - games["Gegentore"].sum(),
-            "Q1_Tordifferenz": games["Q1_Eigene"].sum() - games["Q1_Gast"].sum(),
-            "Q2_Tordifferenz": games["Q2_Eigene"].sum() - games["Q2_Gast"].sum(),
-            "Q3_Tordifferenz": games["Q3_Eigene"].sum() - games["Q3_Gast"].sum(),
-            "Q4_Tordifferenz": games["Q4_Eigene"].sum() - games["Q4_Gast"].sum(),
-            "Siege": (games["Ergebnis_Typ"] == "Sieg").sum(),
-            "Unentschieden": (games["Ergebnis_Typ"] == "Unentschieden").sum(),
-            "Niederlagen": (games["Ergebnis_Typ"] == "Niederlage").sum()
-        }
-
-        stats_list.append(stats)
-
-    return pd.DataFrame(stats_list)
+    teams = list(df_team_plans)
+    if not teams:
+        return pd.DataFrame()
+
+    goal_columns = ["Eigene_Tore", "Gegentore"] + [f"Q{i}_{side}" for i in range(1, 5) for side in ("Eigene", "Gast")]
+    counts = {"Gespielt": ("Status", "Gespielt"), "Offen": ("Status", "Offen"), "Siege": ("Ergebnis_Typ", "Sieg"),
+              "Unentschieden": ("Ergebnis_Typ", "Unentschieden"), "Niederlagen": ("Ergebnis_Typ", "Niederlage")}
+
+    # All team plans stacked once, grouped by the position of the team
+    lengths = [len(games) for games in df_team_plans.values()]
+    games = pd.concat([games[goal_columns + ["Status", "Ergebnis_Typ"]] for games in df_team_plans.values()], ignore_index=True)
+    codes = np.repeat(np.arange(len(teams)), lengths)
+    positions = np.arange(len(teams))
+
+    # Compact goal columns as floats, they would give NA for teams without played games
+    goals = games[goal_columns]
+    goals = goals.astype({col: "float64" for col in goal_columns if not isinstance(goals[col].dtype, np.dtype)})
+    flags = pd.DataFrame({name: (games[col] == value).to_numpy(dtype=bool, na_value=False) for name, (col, value) in counts.items()})
+
+    sums = pd.concat([goals, flags], axis=1).groupby(codes).sum().reindex(positions, fill_value=0)
+    means = goals[["Eigene_Tore", "Gegentore"]].groupby(codes).mean().reindex(positions).round(2)
+
+    stats = pd.DataFrame({
+        "Team": teams,
+        "Spiele_gesamt": np.array(lengths, dtype="int64"),
+        "Gespielt": sums["Gespielt"].values,
+        "Offen": sums["Offen"].values,
+        "Tore_ges": sums["Eigene_Tore"].values,
+        "Gegentore_ges": sums["Gegentore"].values,
+        "Ø Tore": means["Eigene_Tore"].values,
+        "Ø Gegentore": means["Gegentore"].values,
+        "Tordifferenz": (sums["Eigene_Tore"] - sums["Gegentore"]).values,
+        **{f"Q{i}_Tordifferenz": (sums[f"Q{i}_Eigene"] - sums[f"Q{i}_Gast"]).values for i in range(1, 5)},
+        **{name: sums[name].values for name in ["Siege", "Unentschieden", "Niederlagen"]}
+    })
+
+    return stats
+
+# Function to find the games of a new raw game plan that differ from the old one
+# Returns a mask of changed games in the new plan and the numbers of removed games,
+# or None if the plans cannot be matched by Spielnummer
+def find_changed_games(df_old, df_new):
+    old = df_old.set_index("Spielnummer")
+    new = df_new.set_index("Spielnummer")
+    if not old.index.is_unique or not new.index.is_unique or list(old.columns) != list(new.columns):
+        return None
+
+    # Games that are kept have to stay in the same order
+    kept_old = old.index[old.index.isin(new.index)]
+    kept_new = new.index[new.index.isin(old.index)]
+    if not kept_old.equals(kept_new):
+        return None
+
+    aligned = old.reindex(new.index)
+    unchanged = ((aligned == new) | (aligned.isna() & new.isna())).all(axis=1)
+    removed = old.index.difference(new.index)
+
+    return ~unchanged.values, removed
+
+# Function to extend only the changed games of a new raw game plan
+# Returns the extended game plan and the teams of all changed games, None means every team
+def update_game_plan(df_old_raw, df_old, df_new_raw):
+    diff = find_changed_games(df_old_raw, df_new_raw)
+    if diff is None:
+        return extend_game_plan(df_new_raw), None
+    changed, removed = diff
+
+    old_keys = df_old_raw["Spielnummer"].to_numpy()
+    new_keys = df_new_raw["Spielnummer"].to_numpy()
+
+    reused = df_old.set_axis(old_keys).loc[new_keys[~changed]]
+    reused.index = df_new_raw.index[~changed]
+    if not changed.any():
+        df = reused
+    else:
+        extended = extend_game_plan(df_new_raw[changed])
+        df = pd.concat([reused, extended]) if len(reused) else extended
+        df = df.loc[df_new_raw.index]
+
+    # Teams of new and changed games as well as of changed and removed old games
+    stale = np.isin(old_keys, np.concatenate([new_keys[changed], removed.to_numpy()]))
+    teams = pd.concat([
+        df.loc[changed, "Heim"], df.loc[changed, "Gast"],
+        df_old.loc[stale, "Heim"], df_old.loc[stale, "Gast"]
+    ])
+
+    return df, set(teams)
+
+# Function to update the game plans of the given teams, all other plans are reused
+def update_team_plans(df, old_team_plans, teams=None, dtypes=None):
+    if teams is None:
+        return create_team_plans(df, dtypes)
+
+    all_teams = pd.unique(df[["Heim", "Gast"]].values.ravel())
+    teams = teams | {team for team in all_teams if team not in old_team_plans}
+    involved = df["Heim"].isin(teams) | df["Gast"].isin(teams)
+    new_plans = create_team_plans(df[involved], dtypes)
+
+    # Game index of every game number, reused plans follow shifted games
+    positions = pd.Series(df.index, index=df["Spielnummer"].to_numpy())
+
+    team_plans = {}
+    for team in all_teams:
+        if team in teams:
+            team_plans[team] = new_plans[team]
+            continue
+        games = old_team_plans[team]
+        index = positions.loc[games["Spielnummer"].to_numpy()].to_numpy()
+        if not games.index.equals(pd.Index(index)):
+            games = games.set_axis(index)
+        # Only converted if the dictionaries changed, e.g. for a new team
+        team_plans[team] = data_schema.compact_frame(games, dtypes or {})
+
+    return team_plans
+
+# Function to update the statistics of the given teams, all other rows are reused
+def update_team_stats(df_team_plans, old_team_stats, teams=None):
+    if teams is None:
+        return create_team_stats(df_team_plans)
+
+    old_stats = old_team_stats.set_index("Team", drop=False)
+    teams = {team for team in df_team_plans if team in teams or team not in old_stats.index}
+    stats = old_stats
+    if teams:
+        new_stats = create_team_stats({team: df_team_plans[team] for team in df_team_plans if team in teams})
+        stats = pd.concat([old_stats[~old_stats.index.isin(teams)], new_stats.set_index("Team", drop=False)])
+
+    return stats.loc[list(df_team_plans)].reset_index(drop=True)
 
 def split_played_games(df):
     played_games = df["Spiele"].str.extract(r"(?P<Gespielt>\d+)\s*[/]\s*(?P<Gesamt>\d+)")
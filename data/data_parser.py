@@ -1,6 +1,14 @@
 #data_parser.py
 
+import os
+
 import pandas as pd
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
 
 GAMEPLAN_TABLE_INDEX = 1
 GAMEPLAN_CONTENT_ROW_INDEX = 2
@@ -8,9 +16,40 @@ SCOREBOARD_TABLE_INDEX = 2
 SCOREBOARD_CONTENT_ROW_INDEX = 1
 SCOREBOARD_MIN_COLS = 9
 
-def parse_game_plan(soup):
+GAMEPLAN_COLUMNS = ["Spielnummer", "Datum & Uhrzeit", "Heim", "Gast", "Ort", "Ergebnis", "Viertel", "Protokoll"]
+SCOREBOARD_COLUMNS = ["Platzierung", "Team", "Spiele", "Siege", "Niederlagen", "Tore", "Tordifferenz", "Punkte"]
+# Cell index in the score board row for each score board column
+SCOREBOARD_CELLS = [0, 1, 2, 3, 5, 6, 7, 8]
+
+# "lxml" or "soup", defaults to lxml if it is installed
+PARSER_BACKEND = os.environ.get("DSV_PARSER_BACKEND", "lxml" if lxml is not None else "soup")
+
+def _game_plan_frame(rows):
+    # rows yields (cell texts, protocol link) per game
+    columns = {col: [] for col in GAMEPLAN_COLUMNS}
+    for texts, score_link in rows:
+        for col, text in zip(GAMEPLAN_COLUMNS, texts[:7]):
+            columns[col].append(text)
+        columns["Protokoll"].append(score_link)
+
+    if not columns["Spielnummer"]:
+        return pd.DataFrame()
+    return pd.DataFrame(columns)
+
+def _score_board_frame(rows):
+    columns = {col: [] for col in SCOREBOARD_COLUMNS}
+    for texts in rows:
+        if len(texts) < SCOREBOARD_MIN_COLS:
+            continue
+        for col, cell in zip(SCOREBOARD_COLUMNS, SCOREBOARD_CELLS):
+            columns[col].append(texts[cell])
+
+    if not columns["Team"]:
+        return pd.DataFrame()
+    return pd.DataFrame(columns)
+
+def _soup_game_plan_rows(soup):
     game_plan = soup.find_all("table")[GAMEPLAN_TABLE_INDEX]
-    results = []
 
     for games in game_plan.find_all("tr")[GAMEPLAN_CONTENT_ROW_INDEX:]:
         cols = games.find_all("td")
@@ -18,39 +57,49 @@ def parse_game_plan(soup):
         score_tag = cols[5].find("a")
         score_link = score_tag.get("href", "") if score_tag else ""
 
-        results.append({
-            "Spielnummer": cols[0].text,
-            "Datum & Uhrzeit": cols[1].text,
-            "Heim": cols[2].text,
-            "Gast": cols[3].text,
-            "Ort": cols[4].text,
-            "Ergebnis": cols[5].text,
-            "Viertel": cols[6].text,
-            "Protokoll": score_link
-        })
+        yield [col.text for col in cols], score_link
 
-    return pd.DataFrame(results)
+def parse_game_plan(soup):
+    return _game_plan_frame(_soup_game_plan_rows(soup))
 
-def parse_score_board(soup):
+def _soup_score_board_rows(soup):
     score_board = soup.find_all("table")[SCOREBOARD_TABLE_INDEX]
 
-    results = []
-
     for team in score_board.find_all("tr")[SCOREBOARD_CONTENT_ROW_INDEX:]:
-        cols = team.find_all("td")
+        yield [col.text for col in team.find_all("td")]
 
-        if len(cols) < SCOREBOARD_MIN_COLS:
-            continue
+def parse_score_board(soup):
+    return _score_board_frame(_soup_score_board_rows(soup))
+
+def _lxml_game_plan_rows(tables):
+    for games in list(tables[GAMEPLAN_TABLE_INDEX].iter("tr"))[GAMEPLAN_CONTENT_ROW_INDEX:]:
+        cols = list(games.iter("td"))
+
+        score_tag = next(cols[5].iter("a"), None)
+        score_link = score_tag.get("href", "") if score_tag is not None else ""
+
+        yield [str(col.text_content()) for col in cols], score_link
+
+def _lxml_score_board_rows(tables):
+    for team in list(tables[SCOREBOARD_TABLE_INDEX].iter("tr"))[SCOREBOARD_CONTENT_ROW_INDEX:]:
+        yield [str(col.text_content()) for col in team.iter("td")]
+
+# Function to parse game plan and score board from a league page
+def parse_league_page(html, backend=None):
+    backend = backend or PARSER_BACKEND
+
+    if backend == "lxml":
+        if lxml is None:
+            raise ImportError("The lxml parser backend requires the lxml package")
+        tables = list(lxml.html.fromstring(html).iter("table"))
+        df_game_plan = _game_plan_frame(_lxml_game_plan_rows(tables))
+        df_score_board = _score_board_frame(_lxml_score_board_rows(tables))
+    elif backend == "soup":
+        # Only build the tables, the rest of the page is never used
+        soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer("table"))
+        df_game_plan = parse_game_plan(soup)
+        df_score_board = parse_score_board(soup)
+    else:
+        raise ValueError(f"Unknown parser backend: {backend}")
 
-        results.append({
-            "Platzierung": cols[0].text,
-            "Team": cols[1].text,
-            "Spiele": cols[2].text,
-            "Siege": cols[3].text,
-            "Niederlagen": cols[5].text,
-            "Tore": cols[6].text,
-            "Tordifferenz": cols[7].text,
-            "Punkte": cols[8].text
-        })
-
-    return pd.DataFrame(results)
\ No newline at end of file
+    return df_game_plan, df_score_board
@@ -0,0 +1,229 @@
+# data_protocol.py
+
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+
+import pandas as pd
+from bs4 import BeautifulSoup, SoupStrainer
+
+import data.data_metrics as data_metrics
+import data.data_scraper as data_scraper
+
+MAX_PROTOCOL_WORKERS = int(os.environ.get("DSV_PROTOCOL_WORKERS", 4))
+
+# Protocols of finished games never change, so they are kept forever
+PROTOCOL_CACHE_DIR = os.environ.get(
+    "DSV_PROTOCOL_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "wpanalysis", "protocols")
+)
+
+EVENT_COLUMNS = ["Viertel", "Zeit", "Mannschaft", "Spieler", "Ereignis", "Spielstand", "Typ"]
+
+# Header names of the protocol table columns
+HEADER_ALIASES = {
+    "Viertel": ("viertel", "periode", "abschnitt"),
+    "Zeit": ("zeit", "spielzeit", "minute"),
+    "Mannschaft": ("mannschaft", "team", "verein"),
+    "Spieler": ("spieler", "name", "spielername"),
+    "Ereignis": ("ereignis", "aktion", "art"),
+    "Spielstand": ("stand", "spielstand")
+}
+
+QUARTER_HEADING = re.compile(r"(\d)\.\s*(?:viertel|periode)|(?:viertel|periode)\s*(\d)|(5\s*m|fünfmeter)", re.IGNORECASE)
+
+# First matching pattern decides the event type
+EVENT_TYPES = [
+    ("Hinausstellung", re.compile(r"hinausstellung|ausschluss|\bhs\b|\bex\b", re.IGNORECASE)),
+    ("Tor", re.compile(r"\btor\b|\bgoal\b", re.IGNORECASE)),
+    ("Strafwurf", re.compile(r"strafwurf|\b5\s*m\b|fünfmeter", re.IGNORECASE)),
+    ("Auszeit", re.compile(r"auszeit|time-?out", re.IGNORECASE)),
+    ("Karte", re.compile(r"gelb|rot|karte", re.IGNORECASE))
+]
+
+_protocols = {}
+_protocols_lock = threading.Lock()
+
+def _header_columns(texts):
+    columns = {}
+    for index, text in enumerate(texts):
+        text = text.strip().lower()
+        for column, aliases in HEADER_ALIASES.items():
+            if column not in columns and text in aliases:
+                columns[column] = index
+    return columns
+
+def event_type(text):
+    for name, pattern in EVENT_TYPES:
+        if pattern.search(text):
+            return name
+    return "Sonstiges"
+
+# Quarter of a heading or a quarter cell, plain numbers like "2" are quarters, too
+def _quarter(text):
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    match = QUARTER_HEADING.search(text)
+    if not match:
+        return None
+    if match.group(3):
+        return 5
+    return int(match.group(1) or match.group(2))
+
+# Function to parse the events of a match protocol page
+def parse_protocol(html):
+    soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer("table"))
+    events = {col: [] for col in EVENT_COLUMNS}
+
+    for table in soup.find_all("table"):
+        columns = None
+        quarter = None
+
+        for row in table.find_all("tr"):
+            texts = [cell.get_text(" ", strip=True) for cell in row.find_all(["td", "th"])]
+            if columns is None:
+                header = _header_columns(texts)
+                # Event tables are the ones with a time and a player or event column
+                if "Zeit" in header and ("Spieler" in header or "Ereignis" in header):
+                    columns = header
+                continue
+
+            # Rows spanning the whole table start a new quarter
+            if len(texts) == 1:
+                quarter = _quarter(texts[0]) or quarter
+                continue
+            if len(texts) <= max(columns.values()):
+                continue
+
+            values = {col: texts[index] for col, index in columns.items()}
+            # Quarter cells that do not parse fall back to the last quarter heading
+            cell_quarter = _quarter(values["Viertel"]) if "Viertel" in values else None
+            events["Viertel"].append(quarter if cell_quarter is None else cell_quarter)
+            for col in ["Zeit", "Mannschaft", "Spieler", "Ereignis", "Spielstand"]:
+                events[col].append(values.get(col, ""))
+            events["Typ"].append(event_type(values.get("Ereignis", "")))
+
+    df = pd.DataFrame(events, columns=EVENT_COLUMNS)
+    df["Viertel"] = df["Viertel"].astype("Int64")
+
+    return df
+
+def _cache_key(url):
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+def _load_protocol(url):
+    with _protocols_lock:
+        if url in _protocols:
+            return _protocols[url]
+
+    # Reference file holds the digest of the protocol content
+    try:
+        with open(os.path.join(PROTOCOL_CACHE_DIR, "refs", _cache_key(url)), encoding="utf-8") as f:
+            digest = f.read().strip()
+        events = pd.read_pickle(os.path.join(PROTOCOL_CACHE_DIR, "objects", f"{digest}.pkl"))
+    except (OSError, ValueError, EOFError):
+        return None
+
+    with _protocols_lock:
+        _protocols[url] = events
+    return events
+
+def _store_protocol(url, html, events):
+    digest = hashlib.sha1(html.encode("utf-8")).hexdigest()
+    objects_dir = os.path.join(PROTOCOL_CACHE_DIR, "objects")
+    refs_dir = os.path.join(PROTOCOL_CACHE_DIR, "refs")
+    os.makedirs(objects_dir, exist_ok=True)
+    os.makedirs(refs_dir, exist_ok=True)
+
+    object_path = os.path.join(objects_dir, f"{digest}.pkl")
+    if not os.path.exists(object_path):
+        fd, tmp_path = tempfile.mkstemp(dir=objects_dir, suffix=".tmp")
+        os.close(fd)
+        events.to_pickle(tmp_path)
+        os.replace(tmp_path, object_path)
+
+    fd, tmp_path = tempfile.mkstemp(dir=refs_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(digest)
+    os.replace(tmp_path, os.path.join(refs_dir, _cache_key(url)))
+
+    with _protocols_lock:
+        _protocols[url] = events
+
+# Function to fetch, parse and cache the protocol of a finished game
+def fetch_protocol(url):
+    html = data_scraper.fetch_text(url)
+    events = parse_protocol(html)
+    _store_protocol(url, html, events)
+
+    return events
+
+# Function to get the protocols of all finished games of a game plan
+# Cached protocols are reused, only newly finished games are fetched, with fetch=False only cached ones are returned
+def get_protocols(df_game_plan, base_url, max_workers=None, fetch=True):
+    max_workers = max_workers or MAX_PROTOCOL_WORKERS
+    finished = df_game_plan[(df_game_plan["Status"] == "Gespielt") & (df_game_plan["Protokoll"] != "")]
+
+    frames = []
+    missing = {}
+    for number, link in zip(finished["Spielnummer"], finished["Protokoll"]):
+        url = urljoin(base_url, link)
+        events = _load_protocol(url)
+        data_metrics.cache_lookup("protocol", events is not None)
+        if events is None:
+            missing[url] = number
+        else:
+            frames.append(events.assign(Spielnummer=number))
+
+    if missing and fetch:
+        with ThreadPoolExecutor(max_workers) as pool:
+            futures = {pool.submit(fetch_protocol, url): url for url, number in missing.items()}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    events = future.result()
+                except Exception:
+                    # One broken protocol must not fail the refresh, the game is fetched again with the next one
+                    data_metrics.inc("wpanalysis_protocol_errors_total")
+                    print(f"Skipping protocol {url}", file=sys.stderr)
+                    traceback.print_exc()
+                    continue
+                frames.append(events.assign(Spielnummer=missing[url]))
+
+    if not frames:
+        return pd.DataFrame(columns=["Spielnummer"] + EVENT_COLUMNS)
+
+    df = pd.concat(frames, ignore_index=True)
+    df = df[["Spielnummer"] + EVENT_COLUMNS]
+
+    # Keep the order of the game plan
+    order = {number: index for index, number in enumerate(finished["Spielnummer"])}
+    return df.sort_values("Spielnummer", key=lambda numbers: numbers.map(order), kind="stable").reset_index(drop=True)
+
+# Function to count goals per player
+def goal_scorers(df_protocols):
+    goals = df_protocols[df_protocols["Typ"] == "Tor"]
+    return (
+        goals.groupby(["Mannschaft", "Spieler"]).size()
+             .rename("Tore").reset_index()
+             .sort_values("Tore", ascending=False, kind="stable")
+    )
+
+# Function to count exclusions per player
+def exclusions(df_protocols):
+    excluded = df_protocols[df_protocols["Typ"] == "Hinausstellung"]
+    return (
+        excluded.groupby(["Mannschaft", "Spieler"]).size()
+                .rename("Hinausstellungen").reset_index()
+                .sort_values("Hinausstellungen", ascending=False, kind="stable")
+    )
+
+# Function to count the events of every game per quarter and type
+def quarter_events(df_protocols):
+    return df_protocols.groupby(["Spielnummer", "Viertel", "Typ"]).size().unstack(fill_value=0)
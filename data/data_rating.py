@@ -0,0 +1,286 @@
+# data_rating.py
+
+import math
+import os
+import tempfile
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import data.data_history as data_history
+
+# Rating state of all teams and applied games, kept between refreshes so only new games are applied
+RATING_FILE = os.environ.get(
+    "DSV_RATING_FILE", os.path.join(os.path.expanduser("~"), ".cache", "wpanalysis", "ratings.npz")
+)
+PERSIST_RATINGS = os.environ.get("DSV_PERSIST_RATINGS", "1") == "1"
+
+INITIAL_RATING = 1500.0
+K_FACTOR = 20.0
+HOME_ADVANTAGE = 50.0
+# Teams with fewer rated games move twice as fast, their rating is still uncertain
+PROVISIONAL_GAMES = 10
+# Share of the distance to the initial rating a team gives up when it starts a new season
+SEASON_REGRESSION = 1 / 3
+
+# Score of the home team for every result, a 5m shoot-out is close to a draw
+RESULT_SCORES = {"Sieg": 1.0, "Sieg nach 5m": 0.6, "Unentschieden": 0.5, "Niederlage nach 5m": 0.4, "Niederlage": 0.0}
+
+# Applied games in the order they were applied, which is date order, one array entry per game
+# key identifies a game across leagues and seasons, result is compared to find corrected games
+# moment is the date of the game or NaT, home and away are team codes, margin the goal difference after regular time
+GameLog = namedtuple("GameLog", ["key", "result", "season", "moment", "home", "away", "score", "margin"])
+LOG_DTYPES = GameLog(
+    key=str, result=str, season="int32", moment="datetime64[ns]", home="int32", away="int32", score="float64", margin="int32"
+)
+
+# Rating state, rating, games and season are indexed by team code, season is the last season a team played in
+Ratings = namedtuple("Ratings", ["teams", "rating", "games", "season", "log"])
+
+_state = None
+_state_lock = threading.Lock()
+
+def _log(*fields):
+    return GameLog(*(np.asarray(values, dtype=dtype) for values, dtype in zip(fields, LOG_DTYPES)))
+
+def _empty_log():
+    return _log(*([] for _ in GameLog._fields))
+
+def empty_ratings():
+    return Ratings(
+        teams=np.array([], dtype=str), rating=np.array([], dtype="float64"),
+        games=np.array([], dtype="int32"), season=np.array([], dtype="int32"), log=_empty_log()
+    )
+
+def _float(values):
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+# Function to turn finished games into arrays in date order, games without a date go last by game number
+# Goals include the 5m shoot-out, shoot_out_home and shoot_out_away are the shoot-out goals or NaN
+def _finished_games(keys, seasons, moments, numbers, home, away, home_goals, away_goals, shoot_out_home, shoot_out_away):
+    home_goals, away_goals = _float(home_goals), _float(away_goals)
+    shoot_out_home, shoot_out_away = _float(shoot_out_home), _float(shoot_out_away)
+    finished = ~np.isnan(home_goals) & ~np.isnan(away_goals)
+
+    moments = pd.to_datetime(pd.Series(moments), errors="coerce").to_numpy(dtype="datetime64[ns]")
+    numbers = _float(numbers)
+    order = np.lexsort((np.nan_to_num(numbers, nan=np.inf), moments, np.isnat(moments)))
+    order = order[finished[order]]
+
+    shoot_out = ~np.isnan(shoot_out_home) | ~np.isnan(shoot_out_away)
+    regular_home = home_goals - np.nan_to_num(shoot_out_home)
+    regular_away = away_goals - np.nan_to_num(shoot_out_away)
+    score = np.select(
+        [shoot_out & (home_goals > away_goals), shoot_out & (home_goals < away_goals), home_goals > away_goals, home_goals < away_goals],
+        [RESULT_SCORES["Sieg nach 5m"], RESULT_SCORES["Niederlage nach 5m"], RESULT_SCORES["Sieg"], RESULT_SCORES["Niederlage"]],
+        default=RESULT_SCORES["Unentschieden"]
+    )
+
+    home, away = np.asarray(home, dtype=object), np.asarray(away, dtype=object)
+    result = np.array([
+        f"{h}|{a}|{hg:.0f}:{ag:.0f}|{int(s)}"
+        for h, a, hg, ag, s in zip(home[order], away[order], home_goals[order], away_goals[order], shoot_out[order])
+    ], dtype=str)
+
+    return {
+        "key": np.asarray(keys, dtype=str)[order],
+        "result": result,
+        "season": np.asarray(seasons, dtype="int32")[order],
+        "moment": moments[order],
+        "home": home[order],
+        "away": away[order],
+        "score": score[order],
+        "margin": np.abs(regular_home - regular_away)[order].astype("int32")
+    }
+
+def _key(league, number):
+    return "/".join(map(str, tuple(league) + (number,)))
+
+# Function to get the finished games of an extended game plan of a league
+def game_plan_games(df_game_plan, league):
+    moments = pd.to_datetime(df_game_plan["Datum_Uhrzeit"], format="%d.%m.%Y, %H:%M", errors="coerce")
+    moments = moments.fillna(pd.to_datetime(df_game_plan["Datum"], errors="coerce"))
+
+    return _finished_games(
+        [_key(league, number) for number in df_game_plan["Spielnummer"]],
+        np.full(len(df_game_plan), league.season),
+        moments, df_game_plan["Spielnummer"], df_game_plan["Heim"].astype(object), df_game_plan["Gast"].astype(object),
+        df_game_plan["Heim_Tore"], df_game_plan["Gast_Tore"], df_game_plan["Q5_Heim"], df_game_plan["Q5_Gast"]
+    )
+
+# Function to get the finished games of all leagues and seasons in the history database
+def history_games(conn):
+    rows = conn.execute(
+        "SELECT g.season, g.league_id, g.grp, g.state_id, g.spielnummer, COALESCE(g.datum_uhrzeit, g.datum), "
+        "g.heim, g.gast, g.heim_tore, g.gast_tore, q.heim, q.gast "
+        "FROM games g LEFT JOIN quarter_scores q ON q.season = g.season AND q.league_id = g.league_id "
+        "AND q.grp = g.grp AND q.state_id = g.state_id AND q.spielnummer = g.spielnummer AND q.viertel = 5 "
+        "WHERE g.heim_tore IS NOT NULL AND g.gast_tore IS NOT NULL"
+    ).fetchall()
+    columns = list(zip(*rows)) if rows else [[] for _ in range(12)]
+
+    return _finished_games(
+        [_key(row[:4], row[4]) for row in rows], columns[0],
+        pd.to_datetime(pd.Series(columns[5], dtype=object), format="ISO8601", errors="coerce"), columns[4],
+        columns[6], columns[7], columns[8], columns[9], columns[10], columns[11]
+    )
+
+# Function to apply games to rating arrays in place, in the given order
+def _apply(rating, games, season, home, away, score, margin, game_season):
+    rating_list, games_list, season_list = rating.tolist(), games.tolist(), season.tolist()
+
+    for h, a, s, m, game in zip(home.tolist(), away.tolist(), score.tolist(), margin.tolist(), game_season.tolist()):
+        for team in (h, a):
+            if season_list[team] < game:
+                # Teams keep part of their strength into a new season
+                if games_list[team]:
+                    rating_list[team] += SEASON_REGRESSION * (INITIAL_RATING - rating_list[team])
+                season_list[team] = game
+
+        diff = rating_list[h] + HOME_ADVANTAGE - rating_list[a]
+        expected = 1 / (1 + 10 ** (-diff / 400))
+        # Clear wins count more, damped when the favourite wins and raised for upsets
+        winner_diff = diff if s > 0.5 else -diff if s < 0.5 else abs(diff)
+        k = K_FACTOR * (1 + 0.5 * math.log1p(m)) * 2.2 / (winner_diff * 0.001 + 2.2)
+        change = k * (s - expected)
+        rating_list[h] += change * (2 if games_list[h] < PROVISIONAL_GAMES else 1)
+        rating_list[a] -= change * (2 if games_list[a] < PROVISIONAL_GAMES else 1)
+        games_list[h] += 1
+        games_list[a] += 1
+
+    rating[:] = rating_list
+    games[:] = games_list
+    season[:] = season_list
+
+# Function to map team names to codes, teams that are new to the state get the next codes
+def _team_codes(teams, names):
+    index = {team: i for i, team in enumerate(teams.tolist())}
+    new_teams = list(dict.fromkeys(name for name in names.tolist() if name not in index))
+    for team in new_teams:
+        index[team] = len(index)
+
+    return np.array([index[name] for name in names.tolist()], dtype="int32"), np.concatenate([teams, np.array(new_teams, dtype=str)])
+
+# Function to replay a game log from the initial ratings
+def replay(teams, log):
+    n = len(teams)
+    rating = np.full(n, INITIAL_RATING)
+    games = np.zeros(n, dtype="int32")
+    season = np.full(n, np.iinfo("int32").min, dtype="int32")
+    _apply(rating, games, season, log.home, log.away, log.score, log.margin, log.season)
+
+    return Ratings(teams, rating, games, season, log)
+
+# Whether a new game is dated before the last applied game, games without a date count as the latest
+def _dated_before(moments, log_moments):
+    if not len(moments) or not len(log_moments):
+        return False
+    if np.isnat(log_moments[-1]):
+        return bool((~np.isnat(moments)).any())
+    return bool((moments < log_moments[-1]).any())
+
+# Function to apply finished games to a rating state
+# New games are applied on top of the state. A corrected result, a new game dated before the last applied
+# game or an applied game of the league that is no longer finished replays the whole log in date order
+def update_ratings(state, finished, league=None):
+    keys = finished["key"]
+    known = dict(zip(state.log.key.tolist(), state.log.result.tolist()))
+    is_new = np.array([key not in known for key in keys.tolist()], dtype=bool)
+    changed = np.array([known.get(key, result) != result for key, result in zip(keys.tolist(), finished["result"].tolist())], dtype=bool)
+    removed = np.zeros(len(state.log.key), dtype=bool)
+    if league is not None:
+        removed = np.char.startswith(state.log.key, _key(league, "")) & ~np.isin(state.log.key, keys)
+    if not is_new.any() and not changed.any() and not removed.any():
+        return state
+
+    home, teams = _team_codes(state.teams, np.concatenate([finished["home"], finished["away"]]).astype(str))
+    away, home = home[len(keys):], home[:len(keys)]
+    games = _log(keys, finished["result"], finished["season"], finished["moment"], home, away, finished["score"], finished["margin"])
+
+    if changed.any() or removed.any() or _dated_before(games.moment[is_new], state.log.moment):
+        # Corrected games keep their place in the log, removed games are dropped
+        position = {key: i for i, key in enumerate(state.log.key.tolist())}
+        log = [values.tolist() for values in state.log]
+        for i in np.flatnonzero(changed):
+            j = position[keys[i]]
+            for field, values in enumerate(log):
+                values[j] = games[field][i]
+        kept = np.flatnonzero(~removed).tolist()
+        log = _log(*([old[j] for j in kept] + new[is_new].tolist() for old, new in zip(log, games)))
+        # New games are sorted in by date, games of the same date keep their order
+        order = np.lexsort((log.moment, np.isnat(log.moment)))
+        return replay(teams, GameLog(*(values[order] for values in log)))
+
+    n_new = len(teams) - len(state.teams)
+    rating = np.concatenate([state.rating, np.full(n_new, INITIAL_RATING)])
+    played = np.concatenate([state.games, np.zeros(n_new, dtype="int32")])
+    season = np.concatenate([state.season, np.full(n_new, np.iinfo("int32").min, dtype="int32")])
+    _apply(rating, played, season, home[is_new], away[is_new], games.score[is_new], games.margin[is_new], games.season[is_new])
+    log = _log(*(np.concatenate([old, new[is_new]]) for old, new in zip(state.log, games)))
+
+    return Ratings(teams, rating, played, season, log)
+
+def save_ratings(state, path=None):
+    path = path or RATING_FILE
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".", suffix=".npz")
+    with os.fdopen(fd, "wb") as f:
+        np.savez(
+            f, teams=state.teams, rating=state.rating, games=state.games, season=state.season,
+            **{f"log_{field}": values for field, values in zip(GameLog._fields, state.log)}
+        )
+    os.replace(tmp_path, path)
+
+# Function to load a saved rating state, None if there is none
+def load_ratings(path=None):
+    path = path or RATING_FILE
+    try:
+        with np.load(path, allow_pickle=False) as saved:
+            log = GameLog(*(saved[f"log_{field}"] for field in GameLog._fields))
+            return Ratings(saved["teams"], saved["rating"], saved["games"], saved["season"], log)
+    except (OSError, KeyError, ValueError):
+        return None
+
+# Function to start the ratings from the saved state, or from all seasons in the history database
+def initial_ratings():
+    if not PERSIST_RATINGS:
+        return empty_ratings()
+
+    state = load_ratings()
+    if state is not None:
+        return state
+    if os.path.exists(data_history.HISTORY_DB):
+        conn = data_history.connect()
+        try:
+            return update_ratings(empty_ratings(), history_games(conn))
+        finally:
+            conn.close()
+    return empty_ratings()
+
+# Function to get the ratings of the given teams, teams without rated games are left out
+def rating_table(state, teams):
+    index = {team: i for i, team in enumerate(state.teams.tolist())}
+    codes = [index[team] for team in teams if team in index]
+
+    return pd.DataFrame({
+        "Team": state.teams[codes].astype(object),
+        "Elo": np.round(state.rating[codes]).astype("int64"),
+        "Bewertete_Spiele": state.games[codes].astype("int64")
+    })
+
+# Function to apply the finished games of a league to the ratings, returns the ratings of its teams
+def refresh_ratings(df_game_plan, league):
+    global _state
+
+    with _state_lock:
+        if _state is None:
+            _state = initial_ratings()
+        state = update_ratings(_state, game_plan_games(df_game_plan, league), league)
+        if state is not _state and PERSIST_RATINGS:
+            save_ratings(state)
+        _state = state
+
+    teams = pd.unique(df_game_plan[["Heim", "Gast"]].astype(object).values.ravel())
+    return rating_table(state, [team for team in teams if isinstance(team, str)])
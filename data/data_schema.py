@@ -0,0 +1,116 @@
+# data_schema.py
+
+import os
+
+import pandas as pd
+
+# Compact dtypes for the extended frames, set to 0 to keep the plain dtypes
+COMPACT_FRAMES = os.environ.get("DSV_COMPACT_FRAMES", "1") == "1"
+
+# Team name columns share one dictionary across all frames of a league
+TEAM_COLUMNS = ["Heim", "Gast", "Team"]
+
+# Columns with a fixed set of values, in alphabetical order so tables sort as before,
+# weekdays in calendar order
+FIXED_CATEGORIES = {
+    "Status": ["Gespielt", "Offen"],
+    "Ergebnis_Typ": ["Niederlage", "Niederlage nach 5m", "Offen", "Sieg", "Sieg nach 5m"],
+    "Spielort": ["Auswärts", "Heim"],
+    "Wochentag": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+    "Spieltagstyp": ["Wochentag", "Wochenende"]
+}
+
+# Columns with few distinct values that are only known from the data
+CATEGORY_COLUMNS = ["Ort", "Ergebnis", "Datum_str", "Uhrzeit_str", "Uhrzeit"]
+
+# Quarter goals fit into Int8, game goals into Int16, missing goals stay NA
+GOAL_DTYPES = {
+    **{f"Q{i}_{side}": "Int8" for i in range(1, 6) for side in ("Heim", "Gast", "Eigene")},
+    **{col: "Int16" for col in ("Heim_Tore", "Gast_Tore", "Eigene_Tore", "Gegentore")}
+}
+
+BOOLEAN_COLUMNS = ["Wochenende"]
+
+# Names of the frames a processed league consists of
+LEAGUE_FRAMES = ["game_plan", "team_plans", "team_stats", "score_board"]
+
+def _categories(df, col):
+    return sorted(pd.Series(df[col].dropna().unique(), dtype=object)) if col in df.columns else []
+
+# Function to get the dtypes of the compact schema of a league
+# Team plans and stats only hold values of the game plan, so its values define all dictionaries
+def league_dtypes(df_game_plan):
+    if not COMPACT_FRAMES:
+        return {}
+
+    teams = pd.CategoricalDtype(sorted(set(_categories(df_game_plan, "Heim")) | set(_categories(df_game_plan, "Gast"))))
+
+    dtypes = {col: teams for col in TEAM_COLUMNS}
+    for col, categories in FIXED_CATEGORIES.items():
+        dtypes[col] = pd.CategoricalDtype(categories)
+    for col in CATEGORY_COLUMNS:
+        dtypes[col] = pd.CategoricalDtype(_categories(df_game_plan, col))
+    dtypes.update(GOAL_DTYPES)
+    for col in BOOLEAN_COLUMNS:
+        dtypes[col] = "boolean"
+
+    return dtypes
+
+# Function to convert the columns of a frame to the compact schema, columns that already match are kept
+def compact_frame(df, dtypes):
+    columns = {col: dtype for col, dtype in dtypes.items() if col in df.columns and df[col].dtype != dtype}
+    if not columns:
+        return df
+
+    return df.astype(columns)
+
+def _column_bytes(values, seen):
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        return int(values.memory_usage(index=False, deep=True))
+
+    # Shared dictionaries are counted once
+    nbytes = values.cat.codes.nbytes
+    categories = values.dtype.categories
+    if id(categories) not in seen:
+        seen.add(id(categories))
+        nbytes += int(categories.memory_usage(deep=True))
+    return nbytes
+
+# Function to get the memory of a frame or a dict of frames in bytes
+def frame_bytes(value, seen=None):
+    seen = set() if seen is None else seen
+    if isinstance(value, pd.DataFrame):
+        return int(value.index.memory_usage(deep=True)) + sum(_column_bytes(values, seen) for _, values in value.items())
+    if isinstance(value, dict):
+        return sum(frame_bytes(df, seen) for df in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(frame_bytes(df, seen) for df in value)
+    return 0
+
+# Function to report the memory of processed leagues
+# leagues maps a league to its game plan, team plans, team stats and score board
+def memory_report(leagues):
+    rows = []
+    for league, frames in leagues.items():
+        seen = set()
+        for name, value in zip(LEAGUE_FRAMES, frames):
+            rows.append({"Liga": str(league), "Frame": name, "Bytes": frame_bytes(value, seen)})
+
+    return pd.DataFrame(rows, columns=["Liga", "Frame", "Bytes"])
+
+# Function to print the memory per frame and per league
+def print_memory_report(leagues):
+    report = memory_report(leagues)
+    per_league = report.groupby("Liga", sort=False)["Bytes"].sum()
+
+    print(report.to_string(index=False))
+    print()
+    print(per_league.to_string())
+    print(f"Total: {report['Bytes'].sum() / 1024 / 1024:.2f} MiB")
+
+    return report
+
+if __name__ == "__main__":
+    import data.data_handler as data_handler
+
+    print_memory_report({data_handler.SECOND_LEAGUE: data_handler.get_second_league()})
@@ -1,11 +1,270 @@
 # data_scraper.py
 
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 
+import data.data_metrics as data_metrics
+import data.data_singleflight as data_singleflight
+
+# Connect and read timeout in seconds
+REQUEST_TIMEOUT = (float(os.environ.get("DSV_CONNECT_TIMEOUT", 5)), float(os.environ.get("DSV_READ_TIMEOUT", 30)))
+MAX_RETRIES = int(os.environ.get("DSV_MAX_RETRIES", 3))
+RETRY_BACKOFF = float(os.environ.get("DSV_RETRY_BACKOFF", 0.5))
+RETRY_STATUS = (429, 500, 502, 503, 504)
+POOL_SIZE = 10
+MAX_REQUESTS_PER_HOST = int(os.environ.get("DSV_REQUESTS_PER_HOST", 4))
+# Sustained requests per second and burst per host, 0 disables the rate limit
+REQUESTS_PER_SECOND = float(os.environ.get("DSV_REQUESTS_PER_SECOND", 4))
+REQUEST_BURST = int(os.environ.get("DSV_REQUEST_BURST", 8))
+
+# On-disk response cache
+CACHE_DIR = os.environ.get(
+    "DSV_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "wpanalysis", "http")
+)
+CACHE_TTL = float(os.environ.get("DSV_CACHE_TTL", 60))
+CACHE_MAX_BYTES = int(os.environ.get("DSV_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+
+# digest identifies the page content, changed is False for 304s and cache hits
+Page = namedtuple("Page", ["url", "text", "digest", "changed", "from_cache"])
+
+_session = None
+_session_lock = threading.Lock()
+
+# Shared session with connection pooling and retries
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = RateLimitedRetry(
+                total=MAX_RETRIES,
+                backoff_factor=RETRY_BACKOFF,
+                status_forcelist=RETRY_STATUS,
+                allowed_methods=["GET"],
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+# Bounds the number of concurrent requests to the host of url
+def host_limit(url):
+    host = urlsplit(url).netloc
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(MAX_REQUESTS_PER_HOST)
+        return _host_semaphores[host]
+
+# Token bucket that refills at rate tokens per second up to burst tokens
+# Callers reserve a token right away and sleep until it is due, so they are served in order
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Takes one token, returns the seconds the caller waited for it
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+_host_buckets = {}
+_host_buckets_lock = threading.Lock()
+
+# Waits until the host of url may get the next request, shared by all threads of the process
+def rate_limit(url):
+    _wait_for_host(urlsplit(url).hostname)
+
+def _wait_for_host(host):
+    if REQUESTS_PER_SECOND <= 0:
+        return
+    with _host_buckets_lock:
+        if host not in _host_buckets:
+            _host_buckets[host] = TokenBucket(REQUESTS_PER_SECOND, REQUEST_BURST)
+        bucket = _host_buckets[host]
+
+    waited = bucket.acquire()
+    if waited:
+        data_metrics.inc("wpanalysis_rate_limit_wait_seconds_total", waited, host=host)
+
+# Retries of the session take a token of their host like the first request, so they cannot exceed the rate limit
+class RateLimitedRetry(Retry):
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        if _pool is not None:
+            _wait_for_host(_pool.host)
+        return retry
+
+def _cache_paths(url):
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.json"), os.path.join(CACHE_DIR, f"{key}.html")
+
+def _read_cache(url):
+    meta_path, body_path = _cache_paths(url)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(body_path, encoding="utf-8") as f:
+            text = f.read()
+    except (OSError, ValueError):
+        return None, None
+    return meta, text
+
+# Marks a cache entry as used, entries are evicted by their last use
+def _touch_cache(url):
+    try:
+        os.utime(_cache_paths(url)[1])
+    except OSError:
+        pass
+
+def _write_atomic(path, content):
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def _write_cache(url, meta, text=None):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    meta_path, body_path = _cache_paths(url)
+    if text is not None:
+        _write_atomic(body_path, text)
+    _write_atomic(meta_path, json.dumps(meta))
+    evict_cache()
+
+# Remove least recently used entries until the cache fits into CACHE_MAX_BYTES
+# Last use is the newest modification time of the files of an entry, hits touch the body
+def evict_cache(max_bytes=None):
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = {}
+    try:
+        names = os.listdir(CACHE_DIR)
+    except OSError:
+        return
+    for name in names:
+        key, ext = os.path.splitext(name)
+        if ext not in (".json", ".html"):
+            continue
+        try:
+            stat = os.stat(os.path.join(CACHE_DIR, name))
+        except OSError:
+            continue
+        size, last_used = entries.get(key, (0, 0))
+        entries[key] = (size + stat.st_size, max(last_used, stat.st_mtime))
+
+    total = sum(size for size, _ in entries.values())
+    for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+        if total <= max_bytes:
+            break
+        for ext in (".json", ".html"):
+            try:
+                os.remove(os.path.join(CACHE_DIR, key + ext))
+            except OSError:
+                pass
+        total -= size
+
+# Concurrent fetches of the same url with the same ttl and timeout share one request
+_fetches = data_singleflight.SingleFlight("fetch")
+
+# Function to fetch a page with conditional requests and the on-disk cache
+def fetch_dsv(url, ttl=None, timeout=None):
+    return _fetches.do((url, ttl, timeout), _fetch_dsv, url, ttl, timeout)
+
+def _fetch_dsv(url, ttl=None, timeout=None):
+    ttl = CACHE_TTL if ttl is None else ttl
+    timeout = REQUEST_TIMEOUT if timeout is None else timeout
+    meta, cached_text = _read_cache(url)
+
+    if meta is not None and time.time() - meta["fetched_at"] < ttl:
+        data_metrics.cache_lookup("http", True)
+        _touch_cache(url)
+        return Page(url, cached_text, meta["digest"], False, True)
+
+    headers = {}
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        rate_limit(url)
+        response = get_session().get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and meta is not None:
+            meta["fetched_at"] = time.time()
+            _write_cache(url, meta)
+            data_metrics.cache_lookup("http", True)
+            return Page(url, cached_text, meta["digest"], False, True)
+        response.raise_for_status()
+    except requests.RequestException:
+        data_metrics.inc("wpanalysis_fetch_errors_total")
+        # Serve the last known page if DSV is not reachable
+        if meta is not None:
+            _touch_cache(url)
+            return Page(url, cached_text, meta["digest"], False, True)
+        raise
+
+    data_metrics.cache_lookup("http", False)
+    data_metrics.inc("wpanalysis_fetched_bytes_total", len(response.content))
+    text = response.text
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    _write_cache(url, {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "digest": digest,
+        "fetched_at": time.time()
+    }, text)
+    changed = meta is None or meta["digest"] != digest
+
+    return Page(url, text, digest, changed, False)
+
+# Function to fetch a page that is cached elsewhere, bypasses the response cache
+def fetch_text(url, timeout=None):
+    timeout = REQUEST_TIMEOUT if timeout is None else timeout
+    with host_limit(url):
+        try:
+            rate_limit(url)
+            response = get_session().get(url, timeout=timeout)
+            response.raise_for_status()
+        except requests.RequestException:
+            data_metrics.inc("wpanalysis_fetch_errors_total")
+            raise
+    data_metrics.inc("wpanalysis_fetched_bytes_total", len(response.content))
+
+    return response.text
+
+def make_soup(html):
+    return BeautifulSoup(html, "html.parser")
+
 # Function to scrape data from the DSV website
 def scrape_dsv(URL):
-    response = requests.get(URL)
-    soup = BeautifulSoup(response.text, "html.parser")
+    page = fetch_dsv(URL)
+    soup = make_soup(page.text)
 
-    return soup
\ No newline at end of file
+    return soup
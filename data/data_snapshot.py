@@ -0,0 +1,288 @@
+# data_snapshot.py
+
+import datetime
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+import pandas as pd
+
+import data.data_handler as data_handler
+import data.data_history as data_history
+import data.data_metrics as data_metrics
+import data.data_protocol as data_protocol
+import data.data_rating as data_rating
+import data.data_store as data_store
+
+# Seconds between two scheduled refreshes and before retrying a failed one
+REFRESH_INTERVAL = float(os.environ.get("DSV_REFRESH_INTERVAL", 5 * 60))
+RETRY_INTERVAL = float(os.environ.get("DSV_RETRY_INTERVAL", 30))
+# Persist every snapshot and start from the last persisted one
+PERSIST_SNAPSHOTS = os.environ.get("DSV_PERSIST_SNAPSHOTS", "1") == "1"
+# Load every snapshot into the history database
+RECORD_HISTORY = os.environ.get("DSV_RECORD_HISTORY", "1") == "1"
+# "all" scrapes and serves in one process, "worker" only serves the snapshots
+# that the refresher process (python -m data.data_snapshot) persists
+SNAPSHOT_ROLE = os.environ.get("DSV_SNAPSHOT_ROLE", "all")
+# Seconds between two checks of the snapshot store for a new version or a refresh request
+STORE_POLL_INTERVAL = float(os.environ.get("DSV_STORE_POLL_INTERVAL", 2))
+
+# Complete, never modified state of one refresh
+Snapshot = namedtuple("Snapshot", ["game_plan", "team_plans", "team_stats", "score_board", "timestamp", "raw_game_plan", "protocols", "version", "ratings"])
+
+# Content hash of the scraped data, equal for refreshes that found nothing new
+def snapshot_version(*frames):
+    digest = hashlib.sha1()
+    for df in frames:
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        digest.update(",".join(map(str, df.columns)).encode("utf-8"))
+
+    return digest.hexdigest()[:16]
+
+# Ratings are joined in once per snapshot, teams without rated games get NA
+def prepare_score_board(df_score_board, df_ratings):
+    df_score_board = df_score_board.copy()
+    goal_columns = ["Tore_Gemacht", "Tore_Bekommen", "Tordifferenz"]
+    df_score_board[goal_columns] = df_score_board[goal_columns].apply(pd.to_numeric, errors="coerce")
+    df_score_board = df_score_board.fillna(0)
+
+    ratings = dict(zip(df_ratings["Team"], df_ratings["Elo"].tolist()))
+    df_score_board["Elo"] = pd.array([ratings.get(team) for team in df_score_board["Team"]], dtype="Int64")
+
+    return df_score_board
+
+# Function to build a snapshot of the second league
+# With a previous snapshot only the games that changed since then are processed again
+# Only cached protocols are added, enrich_snapshot fetches the others once the standings are published
+def build_snapshot(previous=None):
+    df_raw_game_plan, df_score_board = data_handler.scrape_data_to_df(data_handler.URL_SECOND_LEAGUE)
+    version = snapshot_version(df_raw_game_plan, df_score_board)
+
+    if previous is not None:
+        previous = (previous.raw_game_plan, previous.game_plan, previous.team_plans, previous.team_stats)
+    df_game_plan, df_team_plans, df_team_stats, df_score_board = data_handler.update_game_plan_and_score_board(
+        previous, df_raw_game_plan.copy(), df_score_board
+    )
+    with data_metrics.stage("cached_protocols"):
+        df_protocols = data_protocol.get_protocols(df_game_plan, data_handler.URL_SECOND_LEAGUE, fetch=False)
+    with data_metrics.stage("ratings"):
+        df_ratings = data_rating.refresh_ratings(df_game_plan, data_handler.SECOND_LEAGUE)
+
+    return Snapshot(
+        df_game_plan, df_team_plans, df_team_stats, prepare_score_board(df_score_board, df_ratings),
+        datetime.datetime.now(), df_raw_game_plan, df_protocols, version, df_ratings
+    )
+
+# Function to add the protocols of newly finished games to a snapshot, None if there were none to add
+def enrich_snapshot(snapshot):
+    with data_metrics.stage("protocols"):
+        df_protocols = data_protocol.get_protocols(snapshot.game_plan, data_handler.URL_SECOND_LEAGUE)
+    if df_protocols.equals(snapshot.protocols):
+        return None
+
+    return snapshot._replace(protocols=df_protocols)
+
+# Function to load the last persisted snapshot, None if there is no usable one
+# arrow_backed snapshots share the store files with every other reading process, see data_store.load_snapshot
+def load_persisted_snapshot(store_dir=None, version=None, arrow_backed=False):
+    if not data_store.is_available():
+        return None
+    try:
+        fields = data_store.load_snapshot(store_dir, version, arrow_backed)
+    except (OSError, ValueError, KeyError, data_store.pa.ArrowException):
+        traceback.print_exc()
+        return None
+    if fields is None or set(fields) != set(Snapshot._fields):
+        return None
+
+    return Snapshot(**fields)
+
+def persist_snapshot(snapshot):
+    if not data_store.is_available():
+        return
+    # The published snapshot stays in memory if it cannot be written, e.g. a column Arrow cannot convert
+    try:
+        data_store.save_snapshot(snapshot._asdict())
+    except (OSError, data_store.pa.ArrowException):
+        traceback.print_exc()
+
+def record_history(snapshot, league=data_handler.SECOND_LEAGUE):
+    try:
+        conn = data_history.connect()
+        try:
+            data_history.store_league(conn, league, snapshot.game_plan, snapshot.score_board, snapshot.timestamp)
+        finally:
+            conn.close()
+    except (OSError, sqlite3.Error):
+        traceback.print_exc()
+
+def record_metrics(snapshot):
+    data_metrics.set_gauge("wpanalysis_snapshot_timestamp_seconds", snapshot.timestamp.timestamp())
+    for name in ["game_plan", "team_stats", "score_board", "protocols"]:
+        data_metrics.set_gauge("wpanalysis_rows", len(getattr(snapshot, name)), frame=name)
+    data_metrics.set_gauge("wpanalysis_rows", sum(len(games) for games in snapshot.team_plans.values()), frame="team_plans")
+
+# Rebuilds the snapshot in a background thread and swaps it in once it is complete
+class SnapshotRefresher:
+    def __init__(self, build=build_snapshot, interval=REFRESH_INTERVAL, retry_interval=RETRY_INTERVAL, persist=PERSIST_SNAPSHOTS, history=RECORD_HISTORY, enrich=enrich_snapshot):
+        self.build = build
+        self.enrich = enrich
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.persist = persist
+        self.history = history
+        self._snapshot = None
+        self._ready = threading.Event()
+        self._wake = threading.Event()
+        self._profile_next = False
+        self._thread = None
+
+    # Serve the persisted snapshot right away, the first refresh replaces it
+    def _publish_persisted(self):
+        if self.persist and self._snapshot is None:
+            snapshot = load_persisted_snapshot()
+            if snapshot is not None:
+                self.publish(snapshot)
+
+    def start(self):
+        self._publish_persisted()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="snapshot-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    # Latest published snapshot, only blocks until the very first one exists
+    def current(self, wait=True):
+        if wait:
+            self._ready.wait()
+        return self._snapshot
+
+    def publish(self, snapshot):
+        self._snapshot = snapshot
+        self._ready.set()
+        record_metrics(snapshot)
+
+    # Ask for a refresh without waiting for it, requests during a refresh are merged
+    # With profile the next refresh is profiled with cProfile
+    def request_refresh(self, profile=False):
+        if profile:
+            self._profile_next = True
+        self._wake.set()
+
+    def refresh(self, profile=False):
+        with data_metrics.profiled(profile or data_metrics.PROFILE_REFRESH), data_metrics.stage("refresh"):
+            snapshot = self.build(self._snapshot)
+            self.publish(snapshot)
+            if self.persist:
+                with data_metrics.stage("persist"):
+                    persist_snapshot(snapshot)
+            if self.history:
+                with data_metrics.stage("history"):
+                    record_history(snapshot)
+
+            # Standings are served before the protocols of newly finished games are fetched
+            enriched = self.enrich(snapshot) if self.enrich is not None else None
+            if enriched is not None:
+                self.publish(enriched)
+                if self.persist:
+                    with data_metrics.stage("persist"):
+                        persist_snapshot(enriched)
+
+    # Refreshes in the calling thread, for a process that only writes snapshots
+    def run(self):
+        self._publish_persisted()
+        self._run()
+
+    # Waits for the next refresh, requests of other processes arrive through the snapshot store
+    def _wait(self, timeout, requested):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._wake.wait(min(remaining, STORE_POLL_INTERVAL)):
+                return
+            if self.persist and data_store.refresh_requested_at() != requested:
+                return
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            requested = data_store.refresh_requested_at() if self.persist else None
+            profile, self._profile_next = self._profile_next, False
+            try:
+                self.refresh(profile)
+                data_metrics.inc("wpanalysis_refreshes_total", result="success")
+                timeout = self.interval
+            except Exception:
+                data_metrics.inc("wpanalysis_refreshes_total", result="failure")
+                # Keep serving the last snapshot
+                traceback.print_exc()
+                timeout = self.retry_interval
+            self._wait(timeout, requested)
+
+# Serves the snapshots another process persists, web workers never scrape themselves
+# All workers map the same Arrow files, a new version is picked up with the next check of the store
+class SnapshotReader:
+    def __init__(self, store_dir=None, poll_interval=STORE_POLL_INTERVAL):
+        self.store_dir = store_dir
+        self.poll_interval = poll_interval
+        self._snapshot = None
+        self._version = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if not data_store.is_available():
+            raise RuntimeError("Reading shared snapshots requires the pyarrow package")
+        return self
+
+    def _due(self):
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.poll_interval
+
+    # Latest persisted snapshot, only blocks until the refresher wrote the very first one
+    def current(self, wait=True):
+        while True:
+            if self._due():
+                with self._lock:
+                    if self._due():
+                        self._load()
+                        self._checked_at = time.monotonic()
+            if self._snapshot is not None or not wait:
+                return self._snapshot
+            time.sleep(self.poll_interval)
+
+    def _load(self):
+        version = data_store.current_version(self.store_dir)
+        if version is None or version == self._version:
+            return
+        # None if the version was removed while loading, the next check finds the newer one
+        snapshot = load_persisted_snapshot(self.store_dir, version, arrow_backed=True)
+        if snapshot is None:
+            return
+        self._snapshot = snapshot
+        self._version = version
+        record_metrics(snapshot)
+
+    def request_refresh(self, profile=False):
+        data_store.request_refresh(self.store_dir)
+
+# Function to create the snapshot source of this process, see SNAPSHOT_ROLE
+def snapshot_source(role=None):
+    role = role or SNAPSHOT_ROLE
+    if role == "worker":
+        return SnapshotReader()
+    if role == "all":
+        return SnapshotRefresher()
+    raise ValueError(f"Unknown snapshot role: {role}")
+
+# Refresher process of the multi-worker mode, the only process that scrapes DSV
+# Web workers never refresh, so the refresh, scrape and stage metrics are served from here
+if __name__ == "__main__":
+    if not data_store.is_available():
+        raise SystemExit("The refresher process requires the pyarrow package to share snapshots")
+    if data_metrics.METRICS_PORT:
+        data_metrics.serve_metrics()
+    SnapshotRefresher(persist=True).run()
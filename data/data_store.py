@@ -0,0 +1,180 @@
+# data_store.py
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Last processed snapshots as Arrow IPC files, one directory per version
+STORE_DIR = os.environ.get(
+    "DSV_SNAPSHOT_DIR", os.path.join(os.path.expanduser("~"), ".cache", "wpanalysis", "snapshots")
+)
+KEEP_VERSIONS = 2
+CURRENT_FILE = "CURRENT"
+# Touched by processes that only read snapshots to ask the writing process for a refresh
+REFRESH_FILE = "REFRESH"
+META_FILE = "meta.json"
+# Key column of dicts of dataframes stored as one table
+DICT_KEY_COLUMN = "__key__"
+
+def is_available():
+    return pa is not None
+
+def _write_table(df, path):
+    # One record batch, so readers do not have to unify the dictionaries of many chunks
+    table = pa.Table.from_pandas(df, preserve_index=True).combine_chunks()
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+# Arrow-backed columns keep pointing into the memory map, dictionary columns become categoricals
+def _arrow_dtype(arrow_type):
+    if pa.types.is_dictionary(arrow_type):
+        return None
+    return pd.ArrowDtype(arrow_type)
+
+# With arrow_backed the frame is not copied out of the memory map, all processes reading the file
+# share its pages and only the categorical codes are private
+def _read_table(path, arrow_backed=False):
+    source = pa.memory_map(path, "r")
+    table = pa.ipc.open_file(source).read_all()
+    if arrow_backed:
+        return table.to_pandas(types_mapper=_arrow_dtype)
+
+    with source:
+        return table.to_pandas()
+
+# Frames of a dict that is stored as one table, a frame is only sliced from the table when it is used
+# Slicing every frame up front would cost a few objects per column and frame in every process
+class FrameSlices(Mapping):
+    def __init__(self, df, keys, rows):
+        ends = np.cumsum(rows, dtype="int64")
+        self._df = df
+        self._bounds = {key: (end - n, end) for key, n, end in zip(keys, rows, ends)}
+
+    def __getitem__(self, key):
+        start, end = self._bounds[key]
+        return self._df.iloc[start:end]
+
+    def __iter__(self):
+        return iter(self._bounds)
+
+    def __len__(self):
+        return len(self._bounds)
+
+def _versions(store_dir):
+    try:
+        names = os.listdir(store_dir)
+    except OSError:
+        return []
+    return sorted(name for name in names if os.path.isdir(os.path.join(store_dir, name)) and not name.startswith("."))
+
+# Function to persist the fields of a snapshot
+# Dataframes and dicts of dataframes are written as Arrow files, timestamps and plain values go into the meta file
+def save_snapshot(fields, store_dir=None):
+    store_dir = store_dir or STORE_DIR
+    os.makedirs(store_dir, exist_ok=True)
+    version = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+    tmp_dir = tempfile.mkdtemp(dir=store_dir, prefix=".")
+    meta = {"version": version, "frames": [], "dicts": {}, "dict_rows": {}, "timestamps": {}, "values": {}}
+
+    # A failed write leaves no half written version behind
+    try:
+        for name, value in fields.items():
+            path = os.path.join(tmp_dir, f"{name}.arrow")
+            if isinstance(value, pd.DataFrame):
+                _write_table(value, path)
+                meta["frames"].append(name)
+            elif isinstance(value, dict):
+                keys = list(value)
+                frames = [df.assign(**{DICT_KEY_COLUMN: key}) for key, df in value.items()]
+                _write_table(pd.concat(frames) if frames else pd.DataFrame({DICT_KEY_COLUMN: []}), path)
+                meta["dicts"][name] = keys
+                # Frames are stored one after another, so every frame is a slice of the table
+                meta["dict_rows"][name] = [len(df) for df in value.values()]
+            elif isinstance(value, datetime.datetime):
+                meta["timestamps"][name] = value.isoformat()
+            elif isinstance(value, (str, int, float)):
+                meta["values"][name] = value
+
+        with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # Publish the version by switching the CURRENT pointer
+    os.replace(tmp_dir, os.path.join(store_dir, version))
+    fd, tmp_path = tempfile.mkstemp(dir=store_dir, prefix=".")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(store_dir, CURRENT_FILE))
+
+    for old_version in _versions(store_dir)[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(store_dir, old_version), ignore_errors=True)
+
+    return version
+
+def current_version(store_dir=None):
+    store_dir = store_dir or STORE_DIR
+    try:
+        with open(os.path.join(store_dir, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def request_refresh(store_dir=None):
+    store_dir = store_dir or STORE_DIR
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, REFRESH_FILE), "w", encoding="utf-8") as f:
+        f.write(datetime.datetime.now().isoformat())
+
+# Time of the last refresh request as a timestamp, None if there was none
+def refresh_requested_at(store_dir=None):
+    store_dir = store_dir or STORE_DIR
+    try:
+        return os.stat(os.path.join(store_dir, REFRESH_FILE)).st_mtime
+    except OSError:
+        return None
+
+# Function to load the fields of the last persisted snapshot, None if there is none
+# arrow_backed frames share the memory mapped files instead of copying them, for processes that only read them
+def load_snapshot(store_dir=None, version=None, arrow_backed=False):
+    store_dir = store_dir or STORE_DIR
+    version = version or current_version(store_dir)
+    if version is None:
+        return None
+    version_dir = os.path.join(store_dir, version)
+
+    with open(os.path.join(version_dir, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+
+    fields = {}
+    for name in meta["frames"]:
+        fields[name] = _read_table(os.path.join(version_dir, f"{name}.arrow"), arrow_backed)
+    for name, keys in meta["dicts"].items():
+        df = _read_table(os.path.join(version_dir, f"{name}.arrow"), arrow_backed)
+        rows = meta.get("dict_rows", {}).get(name)
+        if rows is not None:
+            # Slices of the table, no frame is copied
+            slices = FrameSlices(df.drop(columns=DICT_KEY_COLUMN), keys, rows)
+            fields[name] = slices if arrow_backed else dict(slices)
+        else:
+            # Stores written before the row counts were kept
+            groups = dict(list(df.groupby(DICT_KEY_COLUMN, sort=False))) if len(df) else {}
+            fields[name] = {key: groups.get(key, df.iloc[0:0]).drop(columns=DICT_KEY_COLUMN) for key in keys}
+    for name, value in meta["timestamps"].items():
+        fields[name] = datetime.datetime.fromisoformat(value)
+    fields.update(meta.get("values", {}))
+
+    return fields
@@ -0,0 +1,107 @@
+# data_table.py
+
+import math
+
+import numpy as np
+import pandas as pd
+
+# Operators of the DataTable filter syntax, longest first
+FILTER_OPERATORS = [
+    ["ge ", ">="],
+    ["le ", "<="],
+    ["lt ", "<"],
+    ["gt ", ">"],
+    ["ne ", "!="],
+    ["eq ", "="],
+    ["contains "],
+    ["datestartswith "]
+]
+
+# Columns that are displayed as formatted dates but sorted by date
+DATE_COLUMNS = {"Datum_Uhrzeit"}
+
+# Function to build the table view of a game list with sort indexes for all columns
+def create_table_view(df):
+    view = df.reset_index(drop=True)
+
+    sort_indexes = {}
+    for col in view.columns:
+        key = view[col]
+        if col in DATE_COLUMNS:
+            key = pd.to_datetime(key, format="%d.%m.%Y, %H:%M", errors="coerce")
+        # Missing values go last in both directions
+        for direction, ascending in [("asc", True), ("desc", False)]:
+            ranks = key.rank(method="first", ascending=ascending, na_option="bottom").to_numpy()
+            sort_indexes[col, direction] = np.argsort(ranks, kind="stable")
+
+    return view, sort_indexes
+
+def split_filter_part(filter_part):
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find("{") + 1: name_part.rfind("}")]
+
+                value_part = value_part.strip()
+                if value_part and value_part[0] == value_part[-1] and value_part[0] in ("'", '"', "`"):
+                    value = value_part[1:-1].replace("\\" + value_part[0], value_part[0])
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                # Word operators need spaces after them in the filter string
+                return name, operator_type[0].strip(), value
+
+    return None, None, None
+
+# Function to evaluate a DataTable filter query on a table view
+def filter_mask(view, filter_query):
+    mask = np.ones(len(view), dtype=bool)
+    if not filter_query:
+        return mask
+
+    for filter_part in filter_query.split(" && "):
+        col, operator, value = split_filter_part(filter_part)
+        if col not in view.columns:
+            continue
+        values = view[col]
+
+        if operator in ("eq", "ne", "lt", "le", "gt", "ge"):
+            if isinstance(value, float):
+                values = pd.to_numeric(values, errors="coerce")
+            else:
+                values = values.astype(str)
+            result = {
+                "eq": values == value, "ne": values != value,
+                "lt": values < value, "le": values <= value,
+                "gt": values > value, "ge": values >= value
+            }[operator]
+        elif operator == "contains":
+            result = values.astype(str).str.contains(str(value), case=False, regex=False)
+        elif operator == "datestartswith":
+            result = values.astype(str).str.startswith(str(value))
+        else:
+            continue
+
+        mask &= result.fillna(False).to_numpy(dtype=bool)
+
+    return mask
+
+# Function to select one page of a table view
+# Returns the records of the page, the number of pages and the page, which is clamped to the last one
+def table_page(view, sort_indexes, page_current, page_size, sort_by=None, mask=None):
+    order = np.arange(len(view))
+    if sort_by:
+        order = sort_indexes.get((sort_by[0]["column_id"], sort_by[0]["direction"]), order)
+    if mask is not None:
+        order = order[mask[order]]
+
+    page_count = max(1, math.ceil(len(order) / page_size))
+    page_current = min(max(page_current, 0), page_count - 1)
+    start = page_current * page_size
+    records = view.iloc[order[start:start + page_size]].to_dict("records")
+
+    return records, page_count, page_current
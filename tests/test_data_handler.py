@@ -0,0 +1,45 @@
+# test_data_handler.py
+
+import os
+
+import pytest
+
+import data.data_handler as data_handler
+import data.data_metrics as data_metrics
+import data.data_scraper as data_scraper
+
+FIXTURE = os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks", "fixtures", "league_full_season.html")
+STAGES = ["parse", "extend", "team_plans", "team_stats", "score_board"]
+
+@pytest.fixture
+def league_page(monkeypatch):
+    with open(FIXTURE, encoding="utf-8") as f:
+        html = f.read()
+
+    def fetch_league(league):
+        url = data_handler.league_url(league)
+        return data_scraper.Page(url, html, f"digest-{league.league_id}", True, False)
+
+    monkeypatch.setattr(data_handler, "_fetch_league", fetch_league)
+    monkeypatch.setattr(data_handler, "_processed_leagues", {})
+    data_metrics.reset()
+    yield html
+    data_metrics.reset()
+
+def stage_counts():
+    values = dict(data_metrics._values)
+    return {
+        name: values.get(data_metrics._key("wpanalysis_stage_duration_seconds", {"stage": name}), (0, 0.0))[0]
+        for name in STAGES
+    }
+
+# Stages of pages processed in worker processes are recorded once in the parent, as in the fetch threads
+@pytest.mark.parametrize("process_workers", [0, 2])
+def test_get_leagues_records_stages_of_every_page(league_page, process_workers):
+    leagues = [data_handler.League(2024, league_id, "", 17) for league_id in (1, 2)]
+
+    results, errors = data_handler.get_leagues(leagues, 2, process_workers)
+
+    assert not errors and set(results) == set(leagues)
+    assert stage_counts() == {name: 2 for name in STAGES}
+    assert len(results[leagues[0]][0]) > 0
@@ -0,0 +1,56 @@
+# test_data_history.py
+
+import pandas as pd
+import pytest
+
+import data.data_history as data_history
+import data.data_operator as data_operator
+import data.data_handler as data_handler
+from tests.test_data_operator import raw_game_plan
+
+LEAGUES = {
+    data_handler.League(2023, 77, "", 17): raw_game_plan(6, seed=23),
+    data_handler.League(2024, 77, "", 17): raw_game_plan(6, seed=24),
+    data_handler.League(2024, 78, "", 17): raw_game_plan(4, seed=78)
+}
+
+@pytest.fixture
+def conn():
+    conn = data_history.connect(":memory:")
+    for league, df in LEAGUES.items():
+        data_history.store_game_plan(conn, league, data_operator.extend_game_plan(df))
+    yield conn
+    conn.close()
+
+def quarter_differences(df, team):
+    df = data_operator.extend_game_plan(df)
+    home, away = df["Heim"] == team, df["Gast"] == team
+    return [
+        int(df.loc[home, f"Q{i}_Heim"].sum() - df.loc[home, f"Q{i}_Gast"].sum()
+            + df.loc[away, f"Q{i}_Gast"].sum() - df.loc[away, f"Q{i}_Heim"].sum())
+        for i in range(1, 5)
+    ]
+
+@pytest.mark.parametrize("filters", [
+    {"team": "Team B Verein"}, {"seasons": [2024]}, {"league_id": 78}, {"seasons": [2024], "league_id": 77, "team": "Team A Verein"}
+])
+def test_filtered_team_stats_match_unfiltered_rows(conn, filters):
+    stats = data_history.query_team_stats(conn)
+    mask = pd.Series(True, index=stats.index)
+    if "team" in filters:
+        mask &= stats["Team"] == filters["team"]
+    if "seasons" in filters:
+        mask &= stats["Saison"].isin(filters["seasons"])
+    if "league_id" in filters:
+        mask &= stats["Liga"] == filters["league_id"]
+
+    filtered = data_history.query_team_stats(conn, **filters)
+
+    assert len(filtered) > 0
+    pd.testing.assert_frame_equal(filtered, stats[mask].reset_index(drop=True))
+
+def test_quarter_differences_are_own_minus_conceded_goals(conn):
+    stats = data_history.query_team_stats(conn, seasons=[2024], league_id=77, team="Team C Verein")
+
+    expected = quarter_differences(LEAGUES[data_handler.League(2024, 77, "", 17)], "Team C Verein")
+    assert stats[[f"Q{i}_Tordifferenz" for i in range(1, 5)]].iloc[0].tolist() == expected
@@ -0,0 +1,147 @@
+# test_data_operator.py
+
+import random
+
+import pandas as pd
+import pytest
+
+import data.data_operator as data_operator
+import data.data_schema as data_schema
+import tests.reference_operator as reference_operator
+
+# Function to generate a raw game plan as the parser returns it, with open games, 5m shoot-outs and unknown dates
+def raw_game_plan(n_teams=8, seed=0, rounds=2, open_share=0.25):
+    rnd = random.Random(seed)
+    teams = [f"Team {chr(65 + i)} Verein" for i in range(n_teams)]
+    rows = []
+    for r in range(rounds):
+        for i, home in enumerate(teams):
+            for j, away in enumerate(teams):
+                if i == j or (rounds > 1 and (r == 0) != (i < j)):
+                    continue
+                date = f" {rnd.randint(1, 28):02d}.{rnd.choice([1, 2, 3, 10, 11, 12]):02d}.24, {rnd.randint(10, 20):02d}:{rnd.choice(['00', '30'])} Uhr\n"
+                if rnd.random() < 0.05:
+                    date = " n.n. "
+                result, quarters = "", ""
+                if rnd.random() >= open_share:
+                    goals = [(rnd.randint(0, 5), rnd.randint(0, 5)) for _ in range(4)]
+                    home_goals, away_goals = sum(g[0] for g in goals), sum(g[1] for g in goals)
+                    result = f"{home_goals}:{away_goals}"
+                    if home_goals == away_goals:
+                        shoot_out = rnd.randint(2, 5)
+                        goals.append((shoot_out, shoot_out + rnd.choice([-1, 1])))
+                        result = f"{home_goals + goals[4][0]}:{away_goals + goals[4][1]} n.EW"
+                    quarters = "(" + ", ".join(f"{a}:{b}" for a, b in goals) + ")"
+                number = len(rows) + 1
+                rows.append({
+                    "Spielnummer": str(number), "Datum & Uhrzeit": date, "Heim": " " + home, "Gast": away + "\n",
+                    "Ort": "Halle X", "Ergebnis": result, "Viertel": quarters,
+                    "Protokoll": f"Protocol.aspx?Game={number}" if result else ""
+                })
+
+    return pd.DataFrame(rows)
+
+# Values as objects with None for every kind of missing value, to compare frames across dtypes
+def _values(df):
+    df = df.astype(object)
+    return df.where(df.notna(), None)
+
+LEAGUES = {
+    "mixed": lambda: raw_game_plan(8, seed=8),
+    "single_round": lambda: raw_game_plan(3, seed=3, rounds=1),
+    "fully_played": lambda: raw_game_plan(6, seed=1, open_share=0),
+    "not_started": lambda: raw_game_plan(4, seed=4, open_share=1)
+}
+
+@pytest.mark.parametrize("league", LEAGUES)
+def test_team_plans_match_row_wise_implementation(league):
+    df = reference_operator.extend_game_plan(LEAGUES[league]())
+
+    expected = reference_operator.create_team_plans(df.copy())
+    team_plans = data_operator.create_team_plans(df.copy())
+
+    assert list(team_plans) == list(expected)
+    for team in expected:
+        pd.testing.assert_frame_equal(team_plans[team], expected[team])
+    pd.testing.assert_frame_equal(
+        data_operator.create_team_stats(team_plans), reference_operator.create_team_stats(expected)
+    )
+
+@pytest.mark.parametrize("league", LEAGUES)
+def test_compact_team_plans_keep_values(league):
+    df = reference_operator.extend_game_plan(LEAGUES[league]())
+    dtypes = data_schema.league_dtypes(df)
+
+    expected = reference_operator.create_team_plans(df.copy())
+    team_plans = data_operator.create_team_plans(data_schema.compact_frame(df, dtypes), dtypes)
+
+    for team in expected:
+        pd.testing.assert_frame_equal(
+            _values(team_plans[team]), _values(expected[team]), check_dtype=False, check_index_type=False
+        )
+
+# Games with non-breaking spaces, line breaks, missing quarters and 5m shoot-outs
+def edge_case_game_plan():
+    return pd.DataFrame({
+        "Spielnummer": ["1", "2", "3", "4", "5", "6"],
+        "Datum & Uhrzeit": ["\u00a012.10.24, 16:00 Uhr", " 13.10.24,\n18:30 Uhr ", "n.n.", "", "19.10.24, 11:00", "20.10.24,\u00a012:00 Uhr"],
+        "Heim": ["Team\u00a0A", " Team B\n", "Team C", "Team A", "Team B", "Team C\u00a0"],
+        "Gast": ["Team B", "Team C", "Team A\n", "Team C", "Team A", "Team B"],
+        "Ort": ["Halle\u00a0X", "Halle\nY", " ", "Halle X", "Halle Y", "Halle Z"],
+        "Ergebnis": ["10:8", "12:11 n.EW", "", " 7 : 9 ", "5:5", "\u00a09:6\u00a0"],
+        "Viertel": [
+            "(3:2, 2:2, 3:2, 2:2)", "(2:2,\u00a03:3, 1:1, 2:2, 4:3)", "", "(2:3, 5:6)", "(1:1, 2:2, 1:1, 1:1)", "(3:1,\n2:2, 2:2, 2:1)"
+        ],
+        "Protokoll": ["Protocol.aspx?Game=1", "Protocol.aspx?Game=2", "", "", "", "Protocol.aspx?Game=6"]
+    })
+
+# Frames are equal including the Python type of every object cell, e.g. None against NaN
+def assert_same_frame(df, expected):
+    pd.testing.assert_frame_equal(df, expected)
+    for col in expected.columns:
+        if expected[col].dtype == object:
+            assert [type(x) for x in df[col]] == [type(x) for x in expected[col]], col
+
+@pytest.mark.parametrize("league", LEAGUES)
+def test_extend_game_plan_matches_row_wise_implementation(league):
+    df = LEAGUES[league]()
+
+    assert_same_frame(data_operator.extend_game_plan(df.copy()), reference_operator.extend_game_plan(df.copy()))
+
+def test_extend_game_plan_edge_cases():
+    df = edge_case_game_plan()
+
+    extended = data_operator.extend_game_plan(df.copy())
+    assert_same_frame(extended, reference_operator.extend_game_plan(df.copy()))
+
+    assert list(extended["Heim"]) == ["Team A", "Team B", "Team C", "Team A", "Team B", "Team C"]
+    assert list(extended["Ort"]) == ["Halle X", "Halle Y", "", "Halle X", "Halle Y", "Halle Z"]
+    assert extended["Q5_Heim"].iloc[1] == 4 and extended["Q5_Gast"].iloc[1] == 3
+    assert extended[["Q3_Heim", "Q3_Gast"]].iloc[3].isna().all()
+    assert extended[[f"Q{i}_Heim" for i in range(1, 6)]].iloc[2].isna().all()
+
+def test_extend_game_plan_keeps_duplicate_index():
+    df = raw_game_plan(4, seed=2)
+    df.index = [0] * len(df)
+
+    assert_same_frame(data_operator.extend_game_plan(df.copy()), reference_operator.extend_game_plan(df.copy()))
+
+def test_split_quarters_matches_row_wise_implementation():
+    df = reference_operator.clean_text(edge_case_game_plan())
+
+    assert_same_frame(data_operator.split_quarters(df.copy()), reference_operator.split_quarters(df.copy()))
+
+@pytest.mark.parametrize("league", LEAGUES)
+def test_team_stats_of_compact_plans_match_row_wise_implementation(league):
+    df = reference_operator.extend_game_plan(LEAGUES[league]())
+    dtypes = data_schema.league_dtypes(df)
+
+    expected = reference_operator.create_team_plans(df.copy())
+    team_plans = data_operator.create_team_plans(data_schema.compact_frame(df, dtypes), dtypes)
+    # A team without games keeps its row with zero counts
+    expected["Team Ohne Spiele"] = next(iter(expected.values())).iloc[0:0]
+    team_plans["Team Ohne Spiele"] = next(iter(team_plans.values())).iloc[0:0]
+
+    pd.testing.assert_frame_equal(
+        data_operator.create_team_stats(team_plans), reference_operator.create_team_stats(expected), check_dtype=False
+    )
@@ -0,0 +1,38 @@
+# test_data_parser.py
+
+import glob
+import os
+
+import pandas as pd
+import pytest
+from bs4 import BeautifulSoup
+
+import data.data_parser as data_parser
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks", "fixtures", "league_*.html")))
+BACKENDS = [
+    "soup",
+    pytest.param("lxml", marks=pytest.mark.skipif(data_parser.lxml is None, reason="lxml is not installed"))
+]
+
+# Full page tree as built before the parser backends existed
+def parse_full_soup(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return data_parser.parse_game_plan(soup), data_parser.parse_score_board(soup)
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("path", FIXTURES, ids=os.path.basename)
+def test_backends_match_full_soup(path, backend):
+    with open(path, encoding="utf-8") as f:
+        html = f.read()
+
+    expected = parse_full_soup(html)
+    parsed = data_parser.parse_league_page(html, backend=backend)
+
+    assert len(expected[0]) > 0 and len(expected[1]) > 0
+    for frame, expected_frame in zip(parsed, expected):
+        pd.testing.assert_frame_equal(frame, expected_frame)
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        data_parser.parse_league_page("<html></html>", backend="regex")
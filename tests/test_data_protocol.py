@@ -0,0 +1,64 @@
+# test_data_protocol.py
+
+import os
+
+import pandas as pd
+import pytest
+
+import data.data_protocol as data_protocol
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+def test_parse_protocol_numeric_quarter_column():
+    events = data_protocol.parse_protocol(read_fixture("protocol_numeric_quarters.html"))
+
+    # The empty quarter cell falls back to the last quarter heading
+    assert events["Viertel"].tolist() == [1, 1, 2, 3, 3, 4, 5]
+    assert events["Typ"].tolist() == ["Tor", "Hinausstellung", "Tor", "Tor", "Auszeit", "Tor", "Tor"]
+
+def test_goal_scorers_count_numeric_quarters():
+    events = data_protocol.parse_protocol(read_fixture("protocol_numeric_quarters.html"))
+
+    scorers = data_protocol.goal_scorers(events.assign(Spielnummer="12"))
+    assert dict(zip(scorers["Spieler"], scorers["Tore"])) == {"Max Muster": 3, "Erik Beispiel": 1, "Tim Test": 1}
+    assert events["Viertel"].notna().all()
+
+@pytest.mark.parametrize("text, quarter", [("2", 2), (" 4 ", 4), ("3. Viertel", 3), ("Periode 1", 1), ("5m", 5), ("", None), ("-", None)])
+def test_quarter(text, quarter):
+    assert data_protocol._quarter(text) == quarter
+
+def test_get_protocols_skips_broken_protocols(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_protocol, "PROTOCOL_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(data_protocol, "_protocols", {})
+    html = read_fixture("protocol_numeric_quarters.html")
+    parse = data_protocol.parse_protocol
+
+    def fetch_text(url):
+        if url.endswith("Game=2"):
+            return "<table><tr><th>Zeit</th><th>Spieler</th></tr><tr><td>1:00</td></tr></table>"
+        return html
+    def broken_parse(html):
+        if "<td>1:00</td>" in html:
+            raise KeyError("Spieler")
+        return parse(html)
+    monkeypatch.setattr(data_protocol.data_scraper, "fetch_text", fetch_text)
+    monkeypatch.setattr(data_protocol, "parse_protocol", broken_parse)
+
+    df_game_plan = pd.DataFrame({
+        "Spielnummer": ["1", "2", "3"],
+        "Status": ["Gespielt", "Gespielt", "Gespielt"],
+        "Protokoll": ["Protocol.aspx?Game=1", "Protocol.aspx?Game=2", "Protocol.aspx?Game=3"]
+    })
+
+    assert data_protocol.get_protocols(df_game_plan, "http://dsv.test/", fetch=False).empty
+
+    protocols = data_protocol.get_protocols(df_game_plan, "http://dsv.test/", max_workers=2)
+    assert protocols["Spielnummer"].unique().tolist() == ["1", "3"]
+
+    # The broken game is not cached, so the next refresh tries it again
+    assert data_protocol._load_protocol("http://dsv.test/Protocol.aspx?Game=2") is None
+    assert data_protocol._load_protocol("http://dsv.test/Protocol.aspx?Game=1") is not None
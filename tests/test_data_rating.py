@@ -0,0 +1,66 @@
+# test_data_rating.py
+
+import numpy as np
+import pytest
+
+import data.data_handler as data_handler
+import data.data_operator as data_operator
+import data.data_rating as data_rating
+from tests.test_data_operator import raw_game_plan
+
+LEAGUE = data_handler.League(2024, 77, "", 17)
+
+@pytest.fixture
+def game_plan():
+    df = data_operator.extend_game_plan(raw_game_plan(6, seed=20, open_share=0))
+    # Every game gets its own date, so the date order is unambiguous
+    df["Datum_Uhrzeit"] = [f"{1 + i % 28:02d}.{1 + i // 28:02d}.2024, 18:00" for i in range(len(df))]
+    return df
+
+def assert_same_ratings(state, expected):
+    assert state.teams.tolist() == expected.teams.tolist()
+    np.testing.assert_allclose(state.rating, expected.rating)
+    np.testing.assert_array_equal(state.games, expected.games)
+    assert state.log.key.tolist() == expected.log.key.tolist()
+
+def test_new_games_in_date_order_are_applied_on_top(game_plan):
+    first = data_rating.update_ratings(data_rating.empty_ratings(), data_rating.game_plan_games(game_plan[:10], LEAGUE), LEAGUE)
+    state = data_rating.update_ratings(first, data_rating.game_plan_games(game_plan, LEAGUE), LEAGUE)
+
+    expected = data_rating.update_ratings(data_rating.empty_ratings(), data_rating.game_plan_games(game_plan, LEAGUE))
+    assert_same_ratings(state, expected)
+
+def test_late_result_of_an_earlier_game_replays_in_date_order(game_plan):
+    late = game_plan.index[3]
+    first = data_rating.update_ratings(
+        data_rating.empty_ratings(), data_rating.game_plan_games(game_plan.drop(late), LEAGUE), LEAGUE
+    )
+    state = data_rating.update_ratings(first, data_rating.game_plan_games(game_plan, LEAGUE), LEAGUE)
+
+    expected = data_rating.update_ratings(data_rating.empty_ratings(), data_rating.game_plan_games(game_plan, LEAGUE))
+    assert_same_ratings(state, expected)
+
+def test_removed_game_is_taken_back(game_plan):
+    removed = game_plan.index[5]
+    first = data_rating.update_ratings(data_rating.empty_ratings(), data_rating.game_plan_games(game_plan, LEAGUE), LEAGUE)
+    state = data_rating.update_ratings(first, data_rating.game_plan_games(game_plan.drop(removed), LEAGUE), LEAGUE)
+
+    expected = data_rating.update_ratings(data_rating.empty_ratings(), data_rating.game_plan_games(game_plan.drop(removed), LEAGUE))
+    assert_same_ratings(state, expected)
+
+def test_games_of_other_leagues_are_kept(game_plan):
+    other = data_handler.League(2024, 78, "", 17)
+    first = data_rating.update_ratings(data_rating.empty_ratings(), data_rating.game_plan_games(game_plan, other), other)
+
+    state = data_rating.update_ratings(first, data_rating.game_plan_games(game_plan[:0], LEAGUE), LEAGUE)
+
+    assert state is first
+
+def test_saved_ratings_keep_game_dates(game_plan, tmp_path):
+    state = data_rating.update_ratings(data_rating.empty_ratings(), data_rating.game_plan_games(game_plan, LEAGUE), LEAGUE)
+
+    data_rating.save_ratings(state, str(tmp_path / "ratings.npz"))
+    loaded = data_rating.load_ratings(str(tmp_path / "ratings.npz"))
+
+    assert_same_ratings(loaded, state)
+    np.testing.assert_array_equal(loaded.log.moment, state.log.moment)
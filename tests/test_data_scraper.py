@@ -0,0 +1,171 @@
+# test_data_scraper.py
+
+import http.server
+import os
+import threading
+import time
+
+import pytest
+
+import data.data_scraper as data_scraper
+
+# Stand-in for dsvdaten.dsv.de, answers with status and body of the state and honors If-None-Match
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        state = self.server.state
+        state["requests"].append(dict(self.headers))
+        time.sleep(state["delay"])
+        if state["status"] != 200:
+            self.send_error(state["status"])
+            return
+        if self.headers.get("If-None-Match") == state["etag"]:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = state["body"].encode("utf-8")
+        self.send_response(200)
+        self.send_header("ETag", state["etag"])
+        self.send_header("Last-Modified", "Sat, 12 Oct 2024 10:00:00 GMT")
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class _Server(http.server.ThreadingHTTPServer):
+    # Clients that timed out have closed the connection before the answer is written
+    def handle_error(self, request, client_address):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = _Server(("127.0.0.1", 0), _Handler)
+    httpd.state = {"status": 200, "body": "<html>Spielplan</html>", "etag": '"v1"', "delay": 0, "requests": []}
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_scraper, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(data_scraper, "REQUESTS_PER_SECOND", 0)
+    # Fresh session without retry backoff, so server errors fail right away
+    monkeypatch.setattr(data_scraper, "RETRY_BACKOFF", 0)
+    monkeypatch.setattr(data_scraper, "_session", None)
+    yield tmp_path
+    data_scraper._session = None
+
+def url_of(server, path="/League.aspx"):
+    return f"http://127.0.0.1:{server.server_port}{path}"
+
+def test_fetch_revalidates_with_etag(server, cache):
+    url = url_of(server)
+
+    first = data_scraper.fetch_dsv(url, ttl=0)
+    second = data_scraper.fetch_dsv(url, ttl=0)
+
+    assert (first.text, first.changed, first.from_cache) == ("<html>Spielplan</html>", True, False)
+    assert (second.text, second.changed, second.from_cache) == ("<html>Spielplan</html>", False, True)
+    assert second.digest == first.digest
+    assert server.state["requests"][1]["If-None-Match"] == '"v1"'
+    assert server.state["requests"][1]["If-Modified-Since"] == "Sat, 12 Oct 2024 10:00:00 GMT"
+
+def test_fetch_sees_changed_page(server, cache):
+    url = url_of(server)
+    first = data_scraper.fetch_dsv(url, ttl=0)
+
+    server.state.update(body="<html>Neuer Spielplan</html>", etag='"v2"')
+    second = data_scraper.fetch_dsv(url, ttl=0)
+
+    assert second.changed and not second.from_cache
+    assert second.digest != first.digest
+
+def test_fetch_within_ttl_makes_no_request(server, cache):
+    url = url_of(server)
+
+    data_scraper.fetch_dsv(url, ttl=60)
+    page = data_scraper.fetch_dsv(url, ttl=60)
+
+    assert page.from_cache and page.text == "<html>Spielplan</html>"
+    assert len(server.state["requests"]) == 1
+
+def test_fetch_serves_stale_page_on_server_error(server, cache):
+    url = url_of(server)
+    data_scraper.fetch_dsv(url, ttl=0)
+
+    server.state["status"] = 500
+    page = data_scraper.fetch_dsv(url, ttl=0)
+
+    assert page.from_cache and not page.changed
+    assert page.text == "<html>Spielplan</html>"
+
+def test_fetch_without_cache_raises_on_server_error(server, cache):
+    server.state["status"] = 500
+
+    with pytest.raises(data_scraper.requests.RequestException):
+        data_scraper.fetch_dsv(url_of(server), ttl=0)
+
+def test_evict_cache_removes_least_recently_used_entries(cache):
+    urls = [f"http://dsv.test/{i}" for i in range(4)]
+    for age, url in zip([40, 30, 20, 10], urls):
+        data_scraper._write_cache(url, {"url": url, "digest": "d", "fetched_at": time.time()}, "x" * 1000)
+        for path in data_scraper._cache_paths(url):
+            os.utime(path, (time.time() - age, time.time() - age))
+
+    # A hit on the oldest entry makes it the most recently used one
+    assert data_scraper.fetch_dsv(urls[0], ttl=60).from_cache
+    data_scraper.evict_cache(2500)
+
+    kept = [url for url in urls if os.path.exists(data_scraper._cache_paths(url)[1])]
+    assert kept == [urls[0], urls[3]]
+
+def test_token_bucket_paces_requests():
+    bucket = data_scraper.TokenBucket(rate=50, burst=2)
+
+    start = time.monotonic()
+    waits = [bucket.acquire() for _ in range(7)]
+    elapsed = time.monotonic() - start
+
+    # Two tokens of burst, then one token every 20 ms
+    assert waits[:2] == [0.0, 0.0]
+    assert elapsed >= 0.09
+
+class _CountingBucket:
+    def __init__(self):
+        self.tokens = 0
+
+    def acquire(self):
+        self.tokens += 1
+        return 0.0
+
+def test_retries_take_tokens_of_the_rate_limit(server, cache, monkeypatch):
+    bucket = _CountingBucket()
+    monkeypatch.setattr(data_scraper, "REQUESTS_PER_SECOND", 4)
+    monkeypatch.setattr(data_scraper, "MAX_RETRIES", 2)
+    monkeypatch.setattr(data_scraper, "_host_buckets", {"127.0.0.1": bucket})
+    server.state["status"] = 503
+
+    with pytest.raises(data_scraper.requests.RequestException):
+        data_scraper.fetch_dsv(url_of(server), ttl=0)
+
+    assert len(server.state["requests"]) == 3
+    assert bucket.tokens == 3
+
+# A fetch with a shorter timeout must not wait for, or share the result of, a slower one in flight
+def test_concurrent_fetches_with_other_timeout_are_not_shared(server, cache, monkeypatch):
+    monkeypatch.setattr(data_scraper, "MAX_RETRIES", 0)
+    url = url_of(server)
+    server.state["delay"] = 0.5
+    slow = threading.Thread(target=data_scraper.fetch_dsv, args=(url, 0))
+    slow.start()
+    while not server.state["requests"]:
+        time.sleep(0.01)
+
+    with pytest.raises(data_scraper.requests.RequestException):
+        data_scraper.fetch_dsv(url, ttl=0, timeout=(5, 0.1))
+    slow.join()
+
+    assert len(server.state["requests"]) == 2
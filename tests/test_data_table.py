@@ -0,0 +1,26 @@
+# test_data_table.py
+
+import pandas as pd
+
+import data.data_table as data_table
+
+def test_table_page_clamps_to_last_page():
+    view, sort_indexes = data_table.create_table_view(pd.DataFrame({"Spielnummer": range(10)}))
+
+    records, page_count, page_current = data_table.table_page(view, sort_indexes, 5, 4)
+    assert (page_count, page_current) == (3, 2)
+    assert [row["Spielnummer"] for row in records] == [8, 9]
+
+def test_table_page_clamps_after_filter():
+    view, sort_indexes = data_table.create_table_view(pd.DataFrame({"Spielnummer": range(10)}))
+    mask = data_table.filter_mask(view, "{Spielnummer} lt 3")
+
+    records, page_count, page_current = data_table.table_page(view, sort_indexes, 2, 4, mask=mask)
+    assert (page_count, page_current) == (1, 0)
+    assert [row["Spielnummer"] for row in records] == [0, 1, 2]
+
+def test_table_page_of_empty_view():
+    view, sort_indexes = data_table.create_table_view(pd.DataFrame({"Spielnummer": []}))
+
+    records, page_count, page_current = data_table.table_page(view, sort_indexes, 3, 4)
+    assert (records, page_count, page_current) == ([], 1, 0)